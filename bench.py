@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки monitor.py — запускаються локально, без мережі і без Telegram.
+
+  python bench.py parse [--page eliky.html] [--repeat 20]
+  python bench.py equivalence [--eliky eliky.html] [--unci unci.html]
+  python bench.py coldstart [--page eliky.html] [--repeat 5]
+  python bench.py telegram [--messages 120] [--chats 12] [--urgent 12] [--latency 0.03] [--error-rate 0.02]
+  python bench.py ids [--sizes 10000 100000 1000000]
+  python bench.py fingerprint [--records 200000] [--repeat 5]
+
+Без --page використовується синтетична сторінка, схожа на ЄЛіки
+(меню, скрипти, таблиця, великий футер). Щоб поміряти на реальній,
+збережіть її: curl -o eliky.html https://eliky.in.ua/medicament/10986
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import array
+import bisect
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+# monitor.py читає секрети при імпорті — для бенчмарків вони не потрібні
+os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+os.environ.setdefault("CHAT_ID", "0")
+
+import monitor
+from fake_telegram import FakeBotAPI
+
+
+# ── Синтетичні сторінки ───────────────────────────────────────────────────────
+
+def synthetic_eliky(rows: int = 60, filler: int = 3000) -> str:
+    head = (
+        "<html><head><title>Абіратерон — ЄЛіки</title>"
+        + "<script>var cfg = {tables: '<table>'};</script>" * 20
+        + "<style>td { padding: 2px }</style></head><body>"
+        + "<nav>" + "".join(f"<a href='/m/{i}'>Препарат {i}</a>" for i in range(filler // 10)) + "</nav>"
+    )
+    table = ["<table class='availability'><thead><tr>"
+             "<th>Область</th><th>Форма</th><th>Лікарня</th><th>Кількість</th><th>Дата</th>"
+             "</tr></thead><tbody>"]
+    for i in range(rows):
+        table.append(
+            f"<tr><td>Область {i % 24}</td><td>таблетки 250 мг №120</td>"
+            f"<td>Обласний онкологічний центр &amp; філія №{i}</td>"
+            f"<td>{i * 120} <span>таб.</span></td><td>{1 + i % 28:02d}.02.2026</td></tr>"
+        )
+    table.append("</tbody></table>")
+    footer = "<footer>" + "<div class='news'><p>Новина</p><a href='#'>далі</a></div>" * filler + "</footer>"
+    return head + "".join(table) + footer + "</body></html>"
+
+
+def synthetic_unci(rows: int = 800, found: int = 3) -> str:
+    head = (
+        "<html><head><title>Безоплатні ліки — НІР</title></head><body>"
+        "<div class='intro'><p>Перелік лікарських засобів, отриманих як гуманітарна допомога.</p>"
+        "<p><strong>Інформацію оновлено 13.03.2026</strong></p></div>"
+        "<table><tr><th>Назва</th><th>Діюча речовина</th><th>Приміщення</th><th>Наказ</th>"
+        "<th>Од. вим.</th><th>Кіль-ть од.</th><th>Термін</th><th>Форма випуску</th><th>№ партії</th></tr>"
+    )
+    body = []
+    for i in range(rows):
+        name, subst = (f"Зитига {i}", "Абіратерону ацетат") if i % (rows // found) == 7 else (f"Препарат {i}", "Речовина")
+        body.append(
+            f"<tr><td>{name}</td><td>{subst}</td><td>Склад №{i % 3}</td><td>Наказ {i}</td>"
+            f"<td>уп.</td><td>{i}</td><td>12.2027</td><td>таблетки&nbsp;250 мг</td><td>B-{i:05d}</td></tr>"
+        )
+    return head + "".join(body) + "</table><footer><p>© НІР</p></footer></body></html>"
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+
+
+def fixture(name: str):
+    return lambda: load_page(os.path.join(FIXTURES, name), None)
+
+
+def load_page(path: str | None, default) -> str:
+    if not path:
+        return default()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# ── Вимірювання ───────────────────────────────────────────────────────────────
+
+def measure(fn, repeat: int):
+    """(найкращий час, мс; піковий приріст пам'яті, КБ; результат)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024, result
+
+
+def report(title: str, rows: list) -> None:
+    print(f"\n{title}")
+    print(f"  {'варіант':<24}{'час, мс':>12}{'пік пам., КБ':>16}")
+    for name, ms, kb in rows:
+        print(f"  {name:<24}{ms:>12.2f}{kb:>16.0f}")
+
+
+# ── Команди ───────────────────────────────────────────────────────────────────
+
+def available_backends() -> list:
+    return [monitor.make_parser_backend(n) for n in monitor.PARSER_MODULES if monitor.parser_available(n)]
+
+
+def bench_parse(args) -> int:
+    html = load_page(args.page, synthetic_eliky)
+    rows, expected = [], None
+    for backend in available_backends():
+        for scoped in (False, True):
+            ms, kb, records = measure(lambda: monitor.parse_eliky(html, scoped=scoped, backend=backend), args.repeat)
+            expected = records if expected is None else expected
+            assert records == expected, f"{backend.name} scoped={scoped}: записи відрізняються!"
+            rows.append((f"{backend.name} {'scoped' if scoped else 'full'}", ms, kb))
+    report(f"parse_eliky: {len(html) // 1024} КБ HTML, {len(expected or [])} записів", rows)
+    return 0
+
+
+def bench_equivalence(args) -> int:
+    """Усі доступні бекенди мають повертати ідентичні записи — інакше exit 1. Без сторінок — tests/fixtures."""
+    pages = {
+        "ЄЛіки": (load_page(args.eliky, fixture("eliky.html")), lambda html, b: monitor.parse_eliky(html, backend=b)),
+        "НІР":   (load_page(args.unci, fixture("unci.html")), lambda html, b: monitor.parse_unci(html, backend=b)[:2]),
+    }
+    failed = False
+    for source, (html, parse) in pages.items():
+        results = {b.name: parse(html, b) for b in available_backends()}
+        reference_name, reference = next(iter(results.items()))
+        for name, result in results.items():
+            ok = result == reference
+            failed |= not ok
+            print(f"{source:<6} {name:<12} {'OK' if ok else f'ВІДРІЗНЯЄТЬСЯ від {reference_name}'}")
+    return 1 if failed else 0
+
+
+COLDSTART_SNIPPET = """
+import monitor
+with open({page!r}, encoding="utf-8") as f:
+    monitor.parse_eliky(f.read())
+"""
+
+
+def bench_coldstart(args) -> int:
+    """Свіжий інтерпретатор на кожен запуск, як у GitHub Actions: імпорт monitor + розбір ЄЛіки."""
+    html = load_page(args.page, synthetic_eliky)
+    with tempfile.NamedTemporaryFile("w", suffix=".html", encoding="utf-8", delete=False) as f:
+        f.write(html)
+    rows = []
+    try:
+        for backend in available_backends():
+            env = dict(os.environ, HTML_PARSER=backend.name)
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, "-c", COLDSTART_SNIPPET.format(page=f.name)],
+                    env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                )
+                best = min(best, time.perf_counter() - t0)
+            rows.append((backend.name, best * 1000))
+    finally:
+        os.unlink(f.name)
+    print(f"\nХолодний старт (python -c 'import monitor; parse_eliky'), {len(html) // 1024} КБ HTML")
+    print(f"  {'парсер':<24}{'час, мс':>12}")
+    for name, ms in rows:
+        print(f"  {name:<24}{ms:>12.1f}")
+    return 0
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+def bench_telegram(args) -> int:
+    """
+    Пропускна здатність і хвіст затримки Dispatcher проти fake_telegram.py з
+    лімітами як у Telegram: затримка — від submit() до підсумку в results.
+    Ліміти клієнта — як у monitor.py (TG_CHAT_RATE, TG_GLOBAL_RATE, ...).
+    """
+    api = FakeBotAPI(latency=args.latency, jitter=args.latency, error_rate=args.error_rate,
+                     chat_limit=args.chat_limit, global_limit=args.global_limit, seed=1).start()
+    monitor.TELEGRAM_API_BASE = api.url
+    monitor.log.setLevel("ERROR")
+    dispatcher = monitor.Dispatcher()
+    submitted, latencies, outcomes = {}, {}, {"sent": 0, "failed": 0}
+    t0 = time.perf_counter()
+    # Спершу черга рутинних оновлень, за нею — термінові в ті самі чати
+    for i in range(args.messages + args.urgent):
+        priority = monitor.PRIORITY_QUANTITY if i < args.messages else monitor.PRIORITY_URGENT
+        item = {"key": f"m{i}", "chat_id": str(i % args.chats), "priority": priority,
+                "text": f"Повідомлення {i}\n" + "x" * 200}
+        submitted[item["key"]] = time.perf_counter()
+        dispatcher.submit(item)
+    while dispatcher.pending or not dispatcher.results.empty():
+        try:
+            outcome, item, _ = dispatcher.results.get(timeout=args.timeout)
+        except monitor.queue.Empty:
+            break
+        outcomes[outcome] += 1
+        latencies.setdefault(item["priority"], []).append(time.perf_counter() - submitted[item["key"]])
+    elapsed = time.perf_counter() - t0
+    dispatcher.stop()
+    api.stop()
+
+    print(f"\nTelegram: {args.messages} повідомлень у {args.chats} чатів, "
+          f"затримка API {args.latency * 1000:.0f}–{args.latency * 2000:.0f} мс, 5xx {args.error_rate:.0%}, "
+          f"ліміт сервера {args.chat_limit}/с на чат і {args.global_limit}/с загалом")
+    done = sum(map(len, latencies.values()))
+    print(f"  доставлено {outcomes['sent']}, помилок {outcomes['failed']}, не дочекались {len(submitted) - done}")
+    print(f"  за {elapsed:.1f} с → {outcomes['sent'] / elapsed:.1f} повідомлень/с")
+    for priority, values in sorted(latencies.items()):
+        print(f"  {monitor.PRIORITY_NAMES[priority]:<10} ({len(values)}): затримка p50 {percentile(values, .5):.2f} с, "
+              f"p95 {percentile(values, .95):.2f} с, p99 {percentile(values, .99):.2f} с, макс {max(values):.2f} с")
+    print(f"  клієнт: {dispatcher.stats}")
+    print(f"  сервер: {api.stats}")
+    return 0 if outcomes["sent"] == len(submitted) else 1
+
+
+def retained(fn):
+    """(результат, КБ пам'яті, яку він займає — без тимчасових об'єктів побудови)."""
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024
+
+
+def bench_ids(args) -> int:
+    """
+    Пам'ять, розмір на диску і швидкість перевірки для побачених ID: колишній
+    список md5 (32 hex), словник компактних ID з часом появи (як у пам'яті),
+    упаковані масиви (як у знімку), таблиця SQLite і фільтр Блума перед нею.
+    """
+    rng = random.Random(1)
+    now = int(time.time())
+    print("\nПобачені ID: пам'ять, розмір на диску, 100 тис. перевірок (половина — нові ID)")
+    print(f"  {'ID':>9}  {'формат':<32}{'пам., МБ':>10}{'диск, КБ':>12}{'перевірка, мс':>16}")
+    for n in args.sizes:
+        raw = [rng.getrandbits(128) for _ in range(n)]
+        known = [f"{v >> 64:016x}" for v in rng.sample(raw, min(n, 50_000))]
+        probes = known + [f"{rng.getrandbits(64):016x}" for _ in range(100_000 - len(known))]
+
+        def lookups(contains):
+            t0 = time.perf_counter()
+            for rid in probes:
+                contains(rid)
+            return (time.perf_counter() - t0) * 1000
+
+        rows = []
+        legacy, kb = retained(lambda: [f"{v:032x}" for v in raw])
+        legacy_set = set(legacy)
+        rows.append(("список md5 (було)", kb, len(json.dumps(legacy, indent=2)),
+                     lookups(lambda rid: rid in legacy_set)))
+        del legacy, legacy_set
+
+        seen, kb = retained(lambda: {f"{v >> 64:016x}": [now, now] for v in raw})
+        rows.append(("словник {ID: [перша, остання]}", kb, len(json.dumps(seen)),
+                     lookups(lambda rid: rid in seen)))
+
+        arrays, kb = retained(lambda: (
+            array.array("Q", sorted(v >> 64 for v in raw)), array.array("I", [now]) * n, array.array("I", [now]) * n
+        ))
+        ids = arrays[0]
+
+        def in_sorted(rid):
+            value = int(rid, 16)
+            i = bisect.bisect_left(ids, value)
+            return i < len(ids) and ids[i] == value
+
+        rows.append(("упаковані масиви (base64)", kb, len(json.dumps(monitor.pack_seen(seen))), lookups(in_sorted)))
+
+        # Файл, а не :memory: — як state.db у роботі
+        db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        db_file.close()
+        db = sqlite3.connect(db_file.name)
+        db.executescript(monitor.DB_SCHEMA)
+        db.executemany("INSERT INTO seen VALUES ('s', ?, ?, ?)", ((rid, now, now) for rid in seen))
+        db.commit()
+        disk = os.path.getsize(db_file.name)
+
+        def in_db(rid):
+            return db.execute("SELECT 1 FROM seen WHERE source = 's' AND id = ?", (rid,)).fetchone() is not None
+
+        rows.append(("SQLite (індекс)", None, disk, lookups(in_db)))
+
+        def build_bloom():
+            bloom = monitor.BloomFilter(n)
+            for rid in seen:
+                bloom.add(rid)
+            return bloom
+
+        bloom, kb = retained(build_bloom)
+        false_positive = sum(rid in bloom for rid in probes[len(known):])
+        rows.append((f"Блум + SQLite (хибних «так» {false_positive})", kb, len(bloom.dumps()),
+                     lookups(lambda rid: rid in bloom and in_db(rid))))
+        db.close()
+        os.unlink(db_file.name)
+        for name, kb, size, ms in rows:
+            memory = f"{kb / 1024:.1f}" if kb is not None else "—"
+            print(f"  {n:>9}  {name:<32}{memory:>10}{size / 1024:>12.0f}{ms:>16.1f}")
+    return 0
+
+
+def bench_fingerprint(args) -> int:
+    """Скільки коштує ID запису: колишній md5 проти blake2b і xxh3 (якщо встановлено xxhash)."""
+    rng = random.Random(1)
+    records = [
+        (f"Обласний онкологічний центр &amp; філія №{rng.randrange(10_000)}",
+         f"{rng.randrange(1, 500) * 10} таб.", f"{rng.randrange(1, 29):02d}.{rng.randrange(1, 13):02d}.2026")
+        for _ in range(args.records)
+    ]
+    print(f"\nID запису: {args.records} записів ЄЛіки (лікарня, кількість, дата), найкращий з {args.repeat}")
+    print(f"  {'хеш':<12}{'нс/запис':>12}{'млн/с':>10}{'швидше за md5':>16}{'унікальних':>14}")
+    base = None
+    for version, fingerprint in monitor.FINGERPRINTS.items():
+        if not monitor.fingerprint_available(version):
+            print(f"  {version:<12}{'не встановлено':>12}")
+            continue
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            ids = [fingerprint(rec) for rec in records]
+            best = min(best, time.perf_counter() - t0)
+        assert all(len(rid) == monitor.ID_BYTES * 2 for rid in ids), f"{version}: довжина ID"
+        ns = best / args.records * 1e9
+        base = base or ns
+        print(f"  {version:<12}{ns:>12.0f}{args.records / best / 1e6:>10.2f}{base / ns:>15.1f}×{len(set(ids)):>14}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки monitor.py")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("parse", help="full vs scoped парсинг ЄЛіки для кожного HTML-парсера")
+    p.add_argument("--page", help="збережена сторінка ЄЛіки (HTML)")
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("equivalence", help="чи однакові записи з усіх HTML-парсерів")
+    p.add_argument("--eliky", help="збережена сторінка ЄЛіки (HTML)")
+    p.add_argument("--unci", help="збережена сторінка НІР (HTML)")
+    p.set_defaults(func=bench_equivalence)
+
+    p = sub.add_parser("coldstart", help="імпорт + розбір у свіжому інтерпретаторі для кожного парсера")
+    p.add_argument("--page", help="збережена сторінка ЄЛіки (HTML)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_coldstart)
+
+    p = sub.add_parser("telegram", help="пропускна здатність і хвіст затримки відправки через fake_telegram.py")
+    p.add_argument("--messages", type=int, default=120)
+    p.add_argument("--chats", type=int, default=12)
+    p.add_argument("--urgent", type=int, default=12, help="термінових повідомлень після основної черги")
+    p.add_argument("--latency", type=float, default=0.03, help="затримка API, сек (+ до стільки ж випадково)")
+    p.add_argument("--error-rate", type=float, default=0.02, help="частка відповідей 502")
+    p.add_argument("--chat-limit", type=int, default=1, help="ліміт сервера на чат, повідомлень/с")
+    p.add_argument("--global-limit", type=int, default=30, help="загальний ліміт сервера, повідомлень/с")
+    p.add_argument("--timeout", type=float, default=60, help="скільки чекати наступного підсумку, сек")
+    p.set_defaults(func=bench_telegram)
+
+    p = sub.add_parser("ids", help="пам'ять і розмір сховища побачених ID у різних форматах")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.set_defaults(func=bench_ids)
+
+    p = sub.add_parser("fingerprint", help="швидкість обчислення ID записів для кожної версії хешу")
+    p.add_argument("--records", type=int, default=200_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_fingerprint)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Локальна заміна Telegram Bot API — щоб перевіряти сповіщення без справжнього
+токена і без api.telegram.org.
+
+  python fake_telegram.py --port 8081 --latency 0.05 --error-rate 0.02
+  TELEGRAM_API_BASE=http://127.0.0.1:8081 TELEGRAM_TOKEN=x CHAT_ID=1,2 python monitor.py
+
+Підтримує sendMessage, editMessageText і pinChatMessage. Усі повідомлення
+записуються (FakeBotAPI.messages). Імітує:
+  • затримку відповіді (--latency, --jitter);
+  • ліміти Telegram: більше --chat-limit повідомлень за секунду в один чат або
+    --global-limit загалом → 429 з parameters.retry_after, як справжній API;
+  • випадкові 5xx з імовірністю --error-rate;
+  • 400 «message is too long» для тексту довшого за 4096 символів.
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Допуск вікна ліміту: запити, рівномірно розкладені клієнтом на 1/с, приходять
+# із розкидом у кілька мс — справжній Telegram за це не карає
+WINDOW_SLACK = 0.05
+TELEGRAM_MAX_CHARS = 4096
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, chat_limit: int = 1, global_limit: int = 30, seed=None):
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        self.chat_limit, self.global_limit = chat_limit, global_limit
+        self.messages = []        # {"method", "chat_id", "message_id", "text", "at"}
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = {}         # чат -> час успішних відправок за останню секунду
+        self._recent_all = deque()
+        self._texts = {}          # (чат, message_id) -> поточний текст
+        self._next_id = 1
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+                method = self.path.rsplit("/", 1)[-1]
+                status, body = api.handle(method, payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBotAPI":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ── Обробка запитів ──────────────────────────────────────────────────────
+
+    def handle(self, method: str, payload: dict):
+        """(HTTP-статус, тіло відповіді) — у форматі Bot API."""
+        chat_id = str(payload.get("chat_id", ""))
+        with self._lock:
+            # Ліміт рахується за часом надходження запиту, до імітації затримки
+            self.stats["requests"] += 1
+            retry_after = self._rate_limit(chat_id) if method in ("sendMessage", "editMessageText") else 0
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            if retry_after:
+                self.stats["rate_limited"] += 1
+                return 429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }
+            if self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+            handler = getattr(self, f"_{method}", None)
+            if handler is None:
+                return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+            status, body = handler(chat_id, payload)
+            if status == 200:
+                self.stats["ok"] += 1
+            return status, body
+
+    def _rate_limit(self, chat_id: str) -> int:
+        """0 — можна; інакше retry_after у секундах. Викликається під замком."""
+        now = time.monotonic()
+        recent = self._recent.setdefault(chat_id, deque())
+        for window in (recent, self._recent_all):
+            while window and now - window[0] >= 1 - WINDOW_SLACK:
+                window.popleft()
+        if len(recent) >= self.chat_limit or len(self._recent_all) >= self.global_limit:
+            return 1
+        recent.append(now)
+        self._recent_all.append(now)
+        return 0
+
+    def _record(self, method: str, chat_id: str, message_id: int, text: str) -> None:
+        self._texts[chat_id, message_id] = text
+        self.messages.append(
+            {"method": method, "chat_id": chat_id, "message_id": message_id, "text": text, "at": time.time()}
+        )
+
+    def _sendMessage(self, chat_id: str, payload: dict):
+        if not payload.get("text"):
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message text is empty"}
+        if len(payload["text"]) > TELEGRAM_MAX_CHARS:
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message is too long"}
+        message_id, self._next_id = self._next_id, self._next_id + 1
+        self._record("sendMessage", chat_id, message_id, payload["text"])
+        return 200, {"ok": True, "result": {"message_id": message_id, "chat": {"id": chat_id}}}
+
+    def _editMessageText(self, chat_id: str, payload: dict):
+        key = (chat_id, payload.get("message_id"))
+        if key not in self._texts:
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message to edit not found"}
+        if self._texts[key] == payload.get("text"):
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message is not modified"}
+        self._record("editMessageText", chat_id, key[1], payload.get("text", ""))
+        return 200, {"ok": True, "result": {"message_id": key[1], "chat": {"id": chat_id}}}
+
+    def _pinChatMessage(self, chat_id: str, payload: dict):
+        return 200, {"ok": True, "result": True}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальний фейковий Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка відповіді, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="випадкова добавка до затримки, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="частка відповідей 502")
+    parser.add_argument("--chat-limit", type=int, default=1, help="повідомлень за секунду в один чат до 429")
+    parser.add_argument("--global-limit", type=int, default=30, help="повідомлень за секунду загалом до 429")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                     args.chat_limit, args.global_limit).start()
+    print(f"Фейковий Bot API: {api.url}  (TELEGRAM_API_BASE={api.url})")
+    shown = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            for msg in api.messages[shown:]:
+                first_line = msg["text"].splitlines()[0] if msg["text"] else ""
+                print(f"[{msg['chat_id']}] {msg['method']} #{msg['message_id']}: {first_line}")
+            shown = len(api.messages)
+    except KeyboardInterrupt:
+        print(f"\n{api.stats}")
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
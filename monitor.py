@@ -13,20 +13,126 @@
 """
 
 import os
+import sys
+import copy
 import json
+import math
+import array
+import base64
+import queue
+import itertools
+import codecs
 import hashlib
+import html
+import importlib.util
 import logging
+import random
+import sqlite3
+import tempfile
+import threading
+import time
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from bs4 import BeautifulSoup
+from zoneinfo import ZoneInfo
+from functools import lru_cache
+from string import Template
+from html.parser import HTMLParser
 
 ELIKY_URL  = "https://eliky.in.ua/medicament/10986"
 UNCI_URL   = "https://unci.org.ua/bezoplatni-liky"
 STATE_FILE = "state.json"
+STATE_DB   = "state.db"
+STATE_JOURNAL = "state.journal"
+# json — увесь стан у state.json; sqlite — у state.db (див. «Стан у SQLite»)
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "json").strip().lower()
+# Після скількох рядків журналу state.journal переписати state.json цілком (0 — без журналу)
+STATE_COMPACT_EVERY = int(os.environ.get("STATE_COMPACT_EVERY", "48"))
+# packed — побачені ID у state.json як упаковані base64-масиви; json — як словник {ID: [..]}
+SEEN_FORMAT = os.environ.get("SEEN_FORMAT", "packed").strip().lower()
+# ID запису — перші ID_BYTES байт хешу (16 hex-символів)
+ID_BYTES = 8
+# Хеш для ID записів: auto — xxh3 (якщо встановлено xxhash), інакше blake2b (див. «Відбитки записів»)
+ID_HASH = os.environ.get("ID_HASH", "auto").strip().lower()
 
 TELEGRAM_TOKEN = os.environ["TELEGRAM_TOKEN"]
-CHAT_ID        = os.environ["CHAT_ID"]
+CHAT_ID        = os.environ["CHAT_ID"]  # один або кілька через кому: "123456789,-1001234567890,@channel"
 CHECK_SOURCE   = os.environ.get("CHECK_SOURCE", "all").strip().lower()
+# Адреса Bot API; для локальної перевірки — fake_telegram.py (напр. http://127.0.0.1:8081)
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+
+# Пул HTTP-з'єднань: окремий keep-alive пул на кожен хост (ЄЛіки, НІР, Telegram)
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))  # скільки хостів тримаємо в пулі
+HTTP_POOL_MAXSIZE     = int(os.environ.get("HTTP_POOL_MAXSIZE", "4"))      # з'єднань на один хост
+FETCH_TIMEOUT         = float(os.environ.get("FETCH_TIMEOUT", "30"))       # сек, завантаження сторінок
+TELEGRAM_TIMEOUT      = float(os.environ.get("TELEGRAM_TIMEOUT", "15"))    # сек, запити до Telegram API
+
+# PARSE_MODE=scoped — парсити лише таблицю ЄЛіки (SoupStrainer), full — усю сторінку
+PARSE_MODE = os.environ.get("PARSE_MODE", "scoped").strip().lower()
+
+# HTML_PARSER=auto — найшвидший встановлений (selectolax → stream → lxml → html.parser)
+HTML_PARSER = os.environ.get("HTML_PARSER", "auto").strip().lower()
+
+# STREAM_FETCH=1 — читати сторінку частинами і зупинятись після потрібної таблиці
+STREAM_FETCH       = os.environ.get("STREAM_FETCH", "1").strip().lower() in ("1", "true", "yes")
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", "16384"))
+MAX_BODY_BYTES     = int(os.environ.get("MAX_BODY_BYTES", str(5 * 1024 * 1024)))  # захист від «безрозмірних» відповідей
+
+# Повтори при тимчасових помилках: експоненційна затримка з jitter і спільний дедлайн запуску
+RETRY_ATTEMPTS    = int(os.environ.get("RETRY_ATTEMPTS", "3"))        # спроб на одне джерело
+RETRY_BASE_DELAY  = float(os.environ.get("RETRY_BASE_DELAY", "2"))    # сек, перша затримка
+RETRY_MAX_DELAY   = float(os.environ.get("RETRY_MAX_DELAY", "30"))    # сек, стеля затримки
+RUN_DEADLINE      = float(os.environ.get("RUN_DEADLINE", "240"))      # сек від старту — після цього нових спроб немає
+
+# NOTIFY_MODE=digest — нові записи пакуються в мінімум повідомлень (≤ 4096 символів);
+# single — як раніше, окреме повідомлення на кожен запис
+NOTIFY_MODE        = os.environ.get("NOTIFY_MODE", "digest").strip().lower()
+TELEGRAM_MAX_CHARS = 4096
+DIGEST_SEPARATOR   = "\n\n━━━━━━━━━━\n\n"
+
+# Класи сповіщень: менше число — раніше відправляється (черга Dispatcher —
+# пріоритетна), дайджести пакуються окремо в межах класу
+PRIORITY_URGENT   = 0   # НІР: абіратерон у переліку безоплатних ліків
+PRIORITY_NEW      = 1   # ЄЛіки: препарат з'явився в лікарні, якої не було на попередній сторінці
+PRIORITY_QUANTITY = 2   # ЄЛіки: нова кількість / дата в уже відомій лікарні
+PRIORITY_NOTICE   = 3   # НІР: сторінку оновлено, абіратерону немає
+PRIORITY_NAMES = {
+    PRIORITY_URGENT: "НІР", PRIORITY_NEW: "нова лікарня",
+    PRIORITY_QUANTITY: "кількість", PRIORITY_NOTICE: "оновлення НІР",
+}
+
+# Ліміти Telegram: ~30 повідомлень/с на бота, ~1/с в один чат
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", "25"))
+TG_CHAT_RATE   = float(os.environ.get("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST  = float(os.environ.get("TG_CHAT_BURST", "3"))
+TG_WORKERS     = int(os.environ.get("TG_WORKERS", "4"))      # потоків-відправників
+
+# Outbox: скільки запусків пробувати доставити повідомлення і скільки пам'ятати доставлені
+OUTBOX_MAX_RUNS    = int(os.environ.get("OUTBOX_MAX_RUNS", "48"))
+DELIVERED_TTL_DAYS = float(os.environ.get("DELIVERED_TTL_DAYS", "7"))
+
+# LIVE_STATUS=1 — замість повідомлення на кожен запис ЄЛіки тримати в кожному чаті
+# одне закріплене повідомлення з поточною таблицею і редагувати його
+LIVE_STATUS = os.environ.get("LIVE_STATUS", "").strip().lower() in ("1", "true", "yes")
+
+# Вікно згладжування ЄЛіки, хв: нові кількість/дата в уже відомій лікарні
+# накопичуються по ключу (лікарня, форма) і йдуть одним повідомленням з
+# останнім значенням. 0 — кожна зміна одразу
+COALESCE_MINUTES = float(os.environ.get("COALESCE_MINUTES", "0"))
+
+# LOOP_INTERVAL > 0 — не одноразовий запуск (cron), а постійний процес:
+# перевірка кожні LOOP_INTERVAL сек
+LOOP_INTERVAL = float(os.environ.get("LOOP_INTERVAL", "0"))
+
+# Пам'ять побачених ID: запис, якого не було на сторінці SEEN_TTL_DAYS днів,
+# забувається; понад SEEN_MAX_IDS на джерело — забуваються найдавніші
+SEEN_TTL_DAYS = float(os.environ.get("SEEN_TTL_DAYS", "90"))
+SEEN_MAX_IDS  = int(os.environ.get("SEEN_MAX_IDS", "5000"))
+
+# FORCE_PARSE=1 — ігнорувати ETag/Last-Modified і хеш сторінки, завжди парсити повністю
+FORCE_PARSE = os.environ.get("FORCE_PARSE", "").strip().lower() in ("1", "true", "yes")
 
 HEADERS = {
     "User-Agent": (
@@ -36,38 +142,724 @@ HEADERS = {
     )
 }
 
+
+# Мова повідомлень за замовчуванням; окремому чату — через CHAT_ID (див. нижче)
+NOTIFY_LANG = os.environ.get("NOTIFY_LANG", "uk").strip().lower()
+
+# Тихі години задаються для чату в CHAT_ID ("123456789:quiet=23-07") і
+# рахуються за QUIET_TZ. Термінові сповіщення НІР їх ігнорують, якщо
+# QUIET_URGENT_BYPASS=1 (за замовчуванням)
+QUIET_TZ            = ZoneInfo(os.environ.get("QUIET_TZ", "Europe/Kyiv"))
+QUIET_URGENT_BYPASS = os.environ.get("QUIET_URGENT_BYPASS", "1").strip().lower() in ("1", "true", "yes")
+
+
+def parse_quiet(value: str):
+    """
+    "23-07" → (23, 7); None, якщо це не дві години через дефіс. Кінець 24 —
+    кінець доби ("0-24" — увесь день), а не 0: (0, 0) означало б «ніколи».
+    """
+    start, sep, end = value.partition("-")
+    if sep and start.isdigit() and end.isdigit() and int(start) <= 24 and int(end) <= 24:
+        return int(start) % 24, int(end)
+    return None
+
+
+def parse_recipients(spec: str) -> list:
+    """
+    CHAT_ID → список одержувачів [{"chat_id": ..., "lang": ..., "quiet": (з, до) | None}].
+    Після ID через двокрапку — налаштування чату: "123456789:lang=en:quiet=23-07,-1001234567890".
+    Хибне налаштування пропускається з попередженням — чат отримує сповіщення без нього.
+    """
+    recipients = []
+    for part in spec.split(","):
+        chat_id, *options = part.strip().split(":")
+        if not chat_id:
+            continue
+        recipient = {"chat_id": chat_id, "lang": NOTIFY_LANG, "quiet": None}
+        for option in options:
+            name, _, value = option.partition("=")
+            name, value = name.strip().lower(), value.strip()
+            if name == "lang" and value:
+                recipient["lang"] = value.lower()
+            elif name == "quiet" and parse_quiet(value):
+                recipient["quiet"] = parse_quiet(value)
+            else:
+                log.warning(f"CHAT_ID: чат {chat_id} — невідоме або хибне налаштування «{option}» пропущено "
+                            f"(очікується lang=uk або quiet=23-07)")
+        recipients.append(recipient)
+    return recipients
+
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 log = logging.getLogger(__name__)
 
+RECIPIENTS = parse_recipients(CHAT_ID)
+
 
 # ── Стан ──────────────────────────────────────────────────────────────────────
 
 def load_state() -> dict:
+    return load_state_sqlite() if STATE_BACKEND == "sqlite" else load_state_json()
+
+
+def save_state(state: dict) -> None:
+    if STATE_BACKEND == "sqlite":
+        save_state_sqlite(state)
+    else:
+        save_state_json(state)
+
+
+def load_state_json() -> dict:
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, encoding="utf-8") as f:
             data = json.load(f)
+            if isinstance(data, dict):
+                for key in SEEN_KEYS:
+                    if isinstance(data.get(key), dict) and data[key].get("format") == "packed":
+                        data[key] = unpack_seen(data[key])
+                replay_journal(data)
             if isinstance(data, list):
                 data = {"eliky_ids": data, "unci_ids": [], "unci_update_date": ""}
+            # ID раніше зберігались списком — без часу появи; вважаємо, що бачили щойно.
+            # І повним md5 (32 символи) — тепер перші ID_BYTES байт
+            for key in SEEN_KEYS:
+                if isinstance(data.get(key), list):
+                    now = int(time.time())
+                    data[key] = {rid: [now, now] for rid in data[key]}
+                if any(len(rid) > ID_BYTES * 2 for rid in data.get(key, ())):
+                    data[key] = {rid[:ID_BYTES * 2]: seen for rid, seen in data[key].items()}
             # Додаємо нові поля якщо їх немає (сумісність зі старим стейтом)
             data.setdefault("unci_found_this_week", False)
             data.setdefault("unci_week_number", 0)
+            data.setdefault("http_cache", {})
+            data.setdefault("unci_date_locator", {})
+            data.setdefault("outbox", [])
+            data.setdefault("delivered", {})
+            data.setdefault("recipients", {})
+            data.setdefault("live_status", {})
+            data.setdefault("eliky_hospitals", [])
+            data.setdefault("eliky_pending", {})
+            data.setdefault("eliky_rows", {})
+            data.setdefault("deferred", {})
+            data.setdefault("id_version", "md5")  # стан без версії — ID рахувались md5
+            data.setdefault("id_legacy", [])
+            _journal["snapshot"] = copy.deepcopy(data)
             return data
+    return default_state()
+
+
+def default_state() -> dict:
     return {
-        "eliky_ids": [],
-        "unci_ids": [],
+        "eliky_ids": {},                # ID запису -> [перша поява, остання поява] (unix-час)
+        "unci_ids": {},
         "unci_update_date": "",
         "unci_found_this_week": False,  # чи знайшли оновлення НІР цього тижня
         "unci_week_number": 0,          # номер тижня коли знайшли
+        "http_cache": {},               # валідатори (ETag / Last-Modified) для кожного URL
+        "unci_date_locator": {},        # де на сторінці НІР стоїть дата оновлення
+        "outbox": [],                   # повідомлення, ще не підтверджені Telegram
+        "delivered": {},                # ключ ідемпотентності -> час доставки
+        "recipients": {},               # чат -> лічильники доставки і остання помилка
+        "live_status": {},              # чат -> {message_id, hash} живого повідомлення ЄЛіки
+        "eliky_hospitals": [],          # [лікарня, область] з попередньої розібраної сторінки ЄЛіки
+        "eliky_pending": {},            # "лікарня|форма" -> зміни у вікні COALESCE_MINUTES
+        "eliky_rows": {},               # "лікарня|форма" -> [кількість, дата] з попередньої сторінки
+        "deferred": {},                 # чат -> блоки, відкладені на кінець тихих годин
+        "id_version": ID_VERSION,       # яким хешем пораховані ID (див. «Відбитки записів»)
+        "id_legacy": [],                # попередні версії хешу, з яких ID ще переносяться
     }
 
 
-def save_state(state: dict) -> None:
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+def save_state_json(state: dict) -> None:
+    snapshot = _journal["snapshot"]
+    if snapshot is None or _journal["generation"] is None or _journal["broken"] \
+            or _journal["lines"] >= STATE_COMPACT_EVERY:
+        write_snapshot(state)
+        return
+    change = state_diff(snapshot, state)
+    if not change:
+        return
+    change["g"] = _journal["generation"]
+    line = json.dumps(change, ensure_ascii=False)
+    with open(STATE_JOURNAL, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    apply_change(snapshot, json.loads(line))
+    _journal["lines"] += 1
+    log.info(f"Стан: +1 рядок журналу ({len(line.encode())} байт, усього {_journal['lines']})")
+
+
+# ── Надійний запис state.json ────────────────────────────────────────────────
+# GitHub може зупинити job посеред запису; state.json, відкритий через "w",
+# тоді лишається обрізаним, і наступний запуск сповіщає про все заново.
+# Тому знімок пишеться в тимчасовий файл поруч і атомарно підміняє старий
+# (os.replace), а між знімками кожен запуск лише дописує в state.journal один
+# рядок — що змінилось: поля цілком ("set") або окремі ключі словників
+# ("patch": ID, валідатори, outbox…). Кожні STATE_COMPACT_EVERY рядків журнал
+# згортається в новий знімок.
+#
+# Знімок має номер покоління ("_generation"), і рядки журналу — теж: рядки від
+# старого знімка (job упав між записом знімка і очищенням журналу) і обірваний
+# останній рядок при завантаженні пропускаються.
+#
+# Журнал після знімка не видаляється, а обрізається до порожнього: у GitHub
+# Actions він живе в кеші, і відсутній файл не зберігся б — наступний запуск
+# відновив би з кешу старий (можливо, обірваний) журнал.
+
+_journal = {"snapshot": None, "generation": None, "lines": 0, "broken": False}
+_MISSING = object()
+
+
+def write_snapshot(state: dict) -> None:
+    generation = f"{time.time_ns():x}"
+    directory = os.path.dirname(os.path.abspath(STATE_FILE))
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=directory, prefix=".state-", suffix=".tmp", delete=False
+    ) as f:
+        packed = {key: pack_seen(state[key]) for key in SEEN_KEYS if key in state} if SEEN_FORMAT == "packed" else {}
+        json.dump({**state, **packed, "_generation": generation}, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    # NamedTemporaryFile створює файл з правами 0600 — лишаємо ті, що були в state.json
+    os.chmod(f.name, file_mode(STATE_FILE))
+    os.replace(f.name, STATE_FILE)
+    if os.path.exists(STATE_JOURNAL):
+        with open(STATE_JOURNAL, "w", encoding="utf-8") as journal:
+            os.fsync(journal.fileno())
+    _journal.update(snapshot=copy.deepcopy(state), generation=generation, lines=0, broken=False)
+    log.info(f"Стан: знімок {STATE_FILE} переписано, журнал очищено")
+
+
+def file_mode(path: str) -> int:
+    """Права наявного файлу; для нового — як у open(): 0666 без umask."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def replay_journal(data: dict) -> None:
+    """Застосовує до знімка рядки журналу його покоління."""
+    generation = data.pop("_generation", None)
+    _journal.update(generation=generation, lines=0, broken=False)
+    if generation is None or not os.path.exists(STATE_JOURNAL):
+        return
+    with open(STATE_JOURNAL, encoding="utf-8") as f:
+        for line in f:
+            try:
+                change = json.loads(line)
+            except ValueError:
+                # Обірваний запис: далі нічого не дописуємо, наступне збереження — знімком
+                log.warning(f"Стан: пошкоджений рядок {_journal['lines'] + 1} журналу — решту пропущено")
+                _journal["broken"] = True
+                return
+            if change.get("g") != generation:
+                continue
+            apply_change(data, change)
+            _journal["lines"] += 1
+    if _journal["lines"]:
+        log.info(f"Стан: застосовано {_journal['lines']} рядків журналу")
+
+
+def state_diff(old: dict, new: dict) -> dict:
+    change = {}
+    for key, value in new.items():
+        before = old.get(key, _MISSING)
+        if before == value:
+            continue
+        if isinstance(value, dict) and isinstance(before, dict):
+            change.setdefault("patch", {})[key] = {
+                "set": {k: v for k, v in value.items() if before.get(k, _MISSING) != v},
+                "del": [k for k in before if k not in value],
+            }
+        else:
+            change.setdefault("set", {})[key] = value
+    return change
+
+
+def apply_change(data: dict, change: dict) -> None:
+    data.update(change.get("set", {}))
+    for key, patch in change.get("patch", {}).items():
+        target = data.setdefault(key, {})
+        target.update(patch["set"])
+        for k in patch["del"]:
+            target.pop(k, None)
+
+
+# ── Стан у SQLite (STATE_BACKEND=sqlite) ─────────────────────────────────────
+# seen    — побачені ID; первинний ключ (джерело, ID), тож перевірка «чи бачили»
+#           — пошук за індексом, без побудови множини з усіх ID;
+# meta    — решта полів стану (дата НІР, тижневий прапор, валідатори, outbox…)
+#           як JSON; поле переписується, лише якщо значення змінилось;
+# history — коли ID з'явився і коли був забутий.
+# Усе пишеться в одній транзакції, яку фіксує save_state(): запуск, що впав
+# посередині, не лишає половини змін. Якщо бази ще немає, а state.json є —
+# стан імпортується з нього.
+
+SEEN_KEYS = ("eliky_ids", "unci_ids")
+HISTORY_DAYS = 365
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    source TEXT NOT NULL, id TEXT NOT NULL, first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL,
+    PRIMARY KEY (source, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_last_seen ON seen (source, last_seen);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history (ts INTEGER NOT NULL, source TEXT NOT NULL, id TEXT NOT NULL, event TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS history_ts ON history (source, ts);
+"""
+
+# Версія схеми state.db (meta "schema_version"): міграції нижче неї вже виконано.
+# 1 — ID укорочено до ID_BYTES байт
+DB_SCHEMA_VERSION = 1
+
+_db = None
+_db_meta = {}  # ключ -> JSON, як він лежить у meta (щоб писати лише змінене)
+_db_saved_changes = 0
+
+
+def load_state_sqlite() -> dict:
+    global _db, _db_saved_changes
+    fresh = not os.path.exists(STATE_DB)
+    _db = sqlite3.connect(STATE_DB)
+    _db.executescript(DB_SCHEMA)
+    if fresh and os.path.exists(STATE_FILE):
+        import_json_state(load_state_json())
+    migrate_db()
+    state = default_state()
+    for key in SEEN_KEYS:
+        del state[key]
+    _db_meta.clear()
+    for key, value in _db.execute("SELECT key, value FROM meta WHERE key != 'schema_version'"):
+        state[key] = json.loads(value)
+        _db_meta[key] = value
+    if not fresh and "id_version" not in _db_meta:
+        state["id_version"] = "md5"
+    _db_saved_changes = _db.total_changes
+    return state
+
+
+def migrate_db() -> None:
+    """Міграції state.db, яких ще не було (за schema_version), — кожна один раз."""
+    row = _db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    version = int(row[0]) if row else 0
+    if version >= DB_SCHEMA_VERSION:
+        return
+    if version < 1:
+        # Повні md5 з попередніх версій → перші ID_BYTES байт
+        _db.execute("UPDATE OR IGNORE seen SET id = substr(id, 1, ?) WHERE length(id) > ?", (ID_BYTES * 2, ID_BYTES * 2))
+        _db.execute("DELETE FROM seen WHERE length(id) > ?", (ID_BYTES * 2,))
+    _db.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(DB_SCHEMA_VERSION),))
+    _db.commit()
+    log.info(f"Стан: {STATE_DB} оновлено до схеми {DB_SCHEMA_VERSION}")
+
+
+def import_json_state(data: dict) -> None:
+    for key in SEEN_KEYS:
+        _db.executemany(
+            "INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?)",
+            ((key, rid, first, last) for rid, (first, last) in data.pop(key).items()),
+        )
+    _db.executemany(
+        "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+        ((key, json.dumps(value, ensure_ascii=False, sort_keys=True)) for key, value in data.items()),
+    )
+    _db.commit()
+    log.info(f"Стан: {STATE_FILE} імпортовано в {STATE_DB}")
+
+
+def save_state_sqlite(state: dict) -> None:
+    global _db_saved_changes
+    changed = 0
+    for key, value in state.items():
+        dumped = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        if _db_meta.get(key) != dumped:
+            _db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, dumped))
+            _db_meta[key] = dumped
+            changed += 1
+    _db.commit()
+    log.info(
+        f"Стан (SQLite): змінених полів {changed}, "
+        f"записано рядків {_db.total_changes - _db_saved_changes}"
+    )
+    _db_saved_changes = _db.total_changes
+
+
+# ── Побачені ID ───────────────────────────────────────────────────────────────
+# Кожна зміна кількості/дати дає новий ID, тож без прибирання стан лише росте.
+# ID, які є на щойно розібраній сторінці, не видаляються ніколи; решта —
+# коли їх не було SEEN_TTL_DAYS днів або коли ID більше за SEEN_MAX_IDS
+# (тоді першими йдуть ті, що зникли найдавніше).
+
+_seen_stats = {}  # джерело -> {"size": n, "ttl": видалено за віком, "cap": видалено за лімітом}
+
+
+class SeenStore:
+    """Побачені ID одного джерела поверх словника зі стану (змінює його на місці)."""
+
+    bloom_skips = 0  # скільки перевірок обійшлись без сховища (див. SqliteSeenStore)
+
+    def __init__(self, data: dict, ttl_days: float = SEEN_TTL_DAYS, max_ids: int = SEEN_MAX_IDS,
+                 legacy=()):
+        self.data = data
+        self.legacy = list(legacy)  # версії хешу, якими ще можуть бути пораховані ID (record_id)
+        self.rekeyed = 0
+        self.ttl = ttl_days * 86400
+        self.max_ids = max_ids
+        # Час останньої появи уточнюється не частіше, ніж раз на добу (або
+        # на десяту частину TTL) — незмінна сторінка не переписує стан
+        self.touch_every = min(86400, self.ttl / 10)
+
+    def __contains__(self, rid: str) -> bool:
+        return rid in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def rekey(self, old: str, new: str) -> None:
+        """Переносить ID, порахований старою версією хешу, на новий — з часом появи."""
+        self.data[new] = self.data.pop(old)
+        self.rekeyed += 1
+
+    def touch(self, rids, now: int = None) -> None:
+        """Позначає ID як побачені зараз (нові — додає)."""
+        now = now or int(time.time())
+        for rid in rids:
+            seen = self.data.get(rid)
+            if seen is None:
+                self.data[rid] = [now, now]
+            elif now - seen[1] >= self.touch_every:
+                seen[1] = now
+
+    def prune(self, protected: set, now: int = None) -> dict:
+        """Видаляє застарілі ID, крім protected. Повертає {"ttl": n, "cap": n}."""
+        now = now or int(time.time())
+        expired = [
+            rid for rid, (_, last) in self.data.items()
+            if now - last > self.ttl and rid not in protected
+        ]
+        for rid in expired:
+            del self.data[rid]
+        over = len(self.data) - self.max_ids
+        capped = []
+        if over > 0:
+            candidates = sorted(
+                (last, rid) for rid, (_, last) in self.data.items() if rid not in protected
+            )
+            capped = [rid for _, rid in candidates[:over]]
+            for rid in capped:
+                del self.data[rid]
+        return {"ttl": len(expired), "cap": len(capped)}
+
+    def flush(self) -> None:
+        """Те, що сховище тримає поза state (див. SqliteSeenStore), — у state."""
+
+
+class SqliteSeenStore(SeenStore):
+    """
+    Те саме, що SeenStore, але в таблиці seen; кожна зміна — окремий рядок.
+    Перед таблицею — фільтр Блума зі стану (state[source + "_bloom"]): на
+    новий ID він зазвичай одразу відповідає «ні», без запиту до бази. У стан
+    фільтр пишеться раз за перевірку джерела — flush() з note_seen().
+    """
+
+    def __init__(self, db: sqlite3.Connection, source: str, state: dict, **limits):
+        super().__init__({}, **limits)
+        self.legacy = legacy_versions(state)
+        self.db, self.source, self.state = db, source, state
+        self.bloom_key = f"{source}_bloom"
+        self.bloom_skips = 0
+        self.bloom_dirty = False
+        self.bloom = BloomFilter.loads(state[self.bloom_key]) if state.get(self.bloom_key) else None
+        if self.bloom is None or self.bloom.capacity < max(len(self), self.max_ids):
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self) -> None:
+        self.bloom = BloomFilter(max(len(self), self.max_ids, 1000))
+        for (rid,) in self.db.execute("SELECT id FROM seen WHERE source = ?", (self.source,)):
+            self.bloom.add(rid)
+        self.bloom_dirty = True
+
+    def flush(self) -> None:
+        if self.bloom_dirty:
+            self.state[self.bloom_key] = self.bloom.dumps()
+            self.bloom_dirty = False
+
+    def __contains__(self, rid: str) -> bool:
+        if rid not in self.bloom:
+            self.bloom_skips += 1
+            return False
+        return self.db.execute(
+            "SELECT 1 FROM seen WHERE source = ? AND id = ?", (self.source, rid)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM seen WHERE source = ?", (self.source,)).fetchone()[0]
+
+    def rekey(self, old: str, new: str) -> None:
+        self.db.execute("UPDATE seen SET id = ? WHERE source = ? AND id = ?", (new, self.source, old))
+        self.db.execute("INSERT INTO history VALUES (?, ?, ?, ?)", (int(time.time()), self.source, new, f"rekey:{old}"))
+        self.bloom.add(new)
+        self.bloom_dirty = True
+        self.rekeyed += 1
+
+    def touch(self, rids, now: int = None) -> None:
+        now = now or int(time.time())
+        for rid in rids:
+            added = self.db.execute(
+                "INSERT OR IGNORE INTO seen VALUES (?, ?, ?, ?)", (self.source, rid, now, now)
+            ).rowcount
+            if added:
+                self.db.execute("INSERT INTO history VALUES (?, ?, ?, 'new')", (now, self.source, rid))
+                self.bloom.add(rid)
+                self.bloom_dirty = True
+            else:
+                self.db.execute(
+                    "UPDATE seen SET last_seen = ? WHERE source = ? AND id = ? AND last_seen <= ?",
+                    (now, self.source, rid, now - self.touch_every),
+                )
+
+    def prune(self, protected: set, now: int = None) -> dict:
+        now = now or int(time.time())
+        expired = [
+            rid for (rid,) in self.db.execute(
+                "SELECT id FROM seen WHERE source = ? AND last_seen < ?", (self.source, now - self.ttl)
+            ) if rid not in protected
+        ]
+        self._forget(expired, now, "ttl")
+        over = len(self) - self.max_ids
+        capped = []
+        if over > 0:
+            for (rid,) in self.db.execute(
+                "SELECT id FROM seen WHERE source = ? ORDER BY last_seen", (self.source,)
+            ):
+                if rid not in protected:
+                    capped.append(rid)
+                    if len(capped) == over:
+                        break
+            self._forget(capped, now, "cap")
+        if expired or capped:
+            self._rebuild_bloom()  # з фільтра Блума не можна видалити — будуємо заново
+        self.db.execute(
+            "DELETE FROM history WHERE source = ? AND ts < ?", (self.source, now - HISTORY_DAYS * 86400)
+        )
+        return {"ttl": len(expired), "cap": len(capped)}
+
+    def _forget(self, rids: list, now: int, reason: str) -> None:
+        self.db.executemany("DELETE FROM seen WHERE source = ? AND id = ?", ((self.source, r) for r in rids))
+        self.db.executemany(
+            "INSERT INTO history VALUES (?, ?, ?, ?)", ((now, self.source, r, f"evicted:{reason}") for r in rids)
+        )
+
+
+def seen_store(state: dict, key: str) -> SeenStore:
+    if STATE_BACKEND == "sqlite":
+        return SqliteSeenStore(_db, key, state)
+    return SeenStore(state[key], legacy=legacy_versions(state))
+
+
+# ── Компактні ID ─────────────────────────────────────────────────────────────
+# ID — перші ID_BYTES (8) байт хешу запису: ймовірність збігу навіть для
+# мільйона ID ~3·10⁻⁸. У знімку state.json побачені ID одного джерела
+# зберігаються трьома відсортованими масивами (ID як uint64, час першої й
+# останньої появи як uint32) у base64 — ~22 символи на ID замість ~55
+# у словнику {"hex": [перша, остання]}. У пам'яті й у журналі — словник:
+# для перевірок на кшталт «чи бачили» він і є хеш-множиною.
+
+def _pack(values, typecode: str) -> str:
+    packed = array.array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def _unpack(text: str, typecode: str) -> array.array:
+    packed = array.array(typecode)
+    packed.frombytes(base64.b64decode(text))
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed
+
+
+def pack_seen(seen: dict) -> dict:
+    items = sorted((int(rid, 16), first, last) for rid, (first, last) in seen.items())
+    return {
+        "format": "packed",
+        "ids":   _pack((i for i, _, _ in items), "Q"),
+        "first": _pack((f for _, f, _ in items), "I"),
+        "last":  _pack((l for _, _, l in items), "I"),
+    }
+
+
+def unpack_seen(packed: dict) -> dict:
+    width = ID_BYTES * 2
+    return {
+        f"{rid:0{width}x}": [first, last]
+        for rid, first, last in zip(
+            _unpack(packed["ids"], "Q"), _unpack(packed["first"], "I"), _unpack(packed["last"], "I")
+        )
+    }
+
+
+class BloomFilter:
+    """
+    Фільтр Блума на error_rate хибних «так» при capacity ID. ID вже є хешем,
+    тож k позицій беруться з двох його половин (подвійне хешування).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, rid: str):
+        value = int(rid, 16)
+        h1, h2 = value & 0xFFFFFFFF, (value >> 32) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.k))
+
+    def add(self, rid: str) -> None:
+        for pos in self._positions(rid):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, rid: str) -> bool:
+        # Без генератора: для нового ID зазвичай вистачає першої-другої позиції
+        value = int(rid, 16)
+        h1, h2 = value & 0xFFFFFFFF, (value >> 32) | 1
+        size, bits = self.size, self.bits
+        for i in range(self.k):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def dumps(self) -> str:
+        return f"{self.capacity}:{self.size}:{self.k}:" + base64.b64encode(self.bits).decode("ascii")
+
+    @classmethod
+    def loads(cls, text: str) -> "BloomFilter":
+        capacity, size, k, bits = text.split(":", 3)
+        bloom = cls.__new__(cls)
+        bloom.capacity, bloom.size, bloom.k = int(capacity), int(size), int(k)
+        bloom.bits = bytearray(base64.b64decode(bits))
+        return bloom
+
+
+def remember_seen(store: SeenStore, source: str, page_ids: set) -> None:
+    """Після розбору сторінки: оновлює час появи її ID і прибирає застарілі."""
+    store.touch(page_ids)
+    note_seen(store, source, store.prune(page_ids))
+
+
+def note_seen(store: SeenStore, source: str, evicted: dict = None) -> None:
+    """
+    Кінець перевірки джерела: сховище — у стан, його розмір — для підсумку
+    запуску (і тоді, коли сторінку пропущено: 304, той самий хеш).
+    """
+    store.flush()
+    _seen_stats[source] = {
+        "size": len(store), **(evicted or {"ttl": 0, "cap": 0}),
+        "bloom_skips": store.bloom_skips, "rekeyed": store.rekeyed,
+    }
+
+
+# ── Відбитки записів ─────────────────────────────────────────────────────────
+# ID запису — ID_BYTES байт хешу його полів. Раніше це був md5 рядка
+# "|".join(str(p)); тепер — ключований blake2b (або xxh3 з xxhash, якщо він
+# встановлений) від полів через \x1f, якого в тексті сторінок не буває. Поля —
+# текст комірок, тож без str() на кожне (він був дорожчим за сам хеш).
+# Версія хешу зберігається в state["id_version"]. Після зміни версії старі ID
+# не перераховуються (полів записів у стані немає), а переносяться ліниво:
+# якщо нового ID у сховищі немає, а ID того ж запису за попередньою версією
+# (state["id_legacy"]) є — він переїжджає на новий (record_id). Старі версії
+# рахуються лише для ID, яких у сховищі немає, — по хешу на новий запис.
+
+FINGERPRINT_KEY = b"abiraterone-monitor/id"
+_blake2b = hashlib.blake2b(digest_size=ID_BYTES, key=FINGERPRINT_KEY)  # ключ застосовується один раз, далі copy()
+_xxh3_seed = int.from_bytes(FINGERPRINT_KEY[:8], "little")
+_xxhash = None
+
+
+def _fingerprint_md5(parts) -> str:
+    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()[:ID_BYTES * 2]
+
+
+def _fingerprint_blake2b(parts) -> str:
+    h = _blake2b.copy()
+    h.update("\x1f".join(parts).encode())
+    return h.hexdigest()
+
+
+def _fingerprint_xxh3(parts) -> str:
+    return _xxhash.xxh3_64_hexdigest("\x1f".join(parts).encode(), seed=_xxh3_seed)
+
+
+FINGERPRINTS = {"md5": _fingerprint_md5, "blake2b": _fingerprint_blake2b, "xxh3": _fingerprint_xxh3}
+
+
+def fingerprint_available(version: str) -> bool:
+    global _xxhash
+    if version == "xxh3" and _xxhash is None and importlib.util.find_spec("xxhash"):
+        import xxhash
+        _xxhash = xxhash
+    return version in FINGERPRINTS and (version != "xxh3" or _xxhash is not None)
+
+
+def select_fingerprint(preferred: str = "auto") -> str:
+    """ID_HASH=auto — xxh3, якщо встановлено xxhash, інакше blake2b."""
+    if preferred not in ("auto", *FINGERPRINTS):
+        log.warning(f"ID_HASH «{preferred}» невідомий — обираємо автоматично")
+        preferred = "auto"
+    if preferred in ("auto", "xxh3"):
+        if fingerprint_available("xxh3"):
+            return "xxh3"
+        if preferred == "xxh3":
+            log.warning("ID_HASH=xxh3, але xxhash не встановлено — використовуємо blake2b")
+        return "blake2b"
+    return preferred
 
 
-def make_id(*parts) -> str:
-    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+ID_VERSION = select_fingerprint(ID_HASH)
+_make_id = FINGERPRINTS[ID_VERSION]
+
+
+def make_id(*parts: str) -> str:
+    return _make_id(parts)
+
+
+def record_id(store: SeenStore, *parts: str) -> str:
+    """make_id(*parts); ID того ж запису за попередньою версією хешу переносить на новий."""
+    rid = _make_id(parts)
+    if store.legacy and rid not in store:
+        for version in store.legacy:
+            old = FINGERPRINTS[version](parts)
+            if old in store:
+                store.rekey(old, rid)
+                break
+    return rid
+
+
+def upgrade_id_version(state: dict) -> None:
+    """Після зміни хешу запам'ятовує попередню версію в state["id_legacy"]."""
+    legacy = state["id_legacy"]
+    if state["id_version"] != ID_VERSION:
+        log.info(f"ID записів: {state['id_version']} → {ID_VERSION}, старі ID переносяться під час перевірок")
+        if state["id_version"] not in legacy:
+            legacy.insert(0, state["id_version"])
+        state["id_version"] = ID_VERSION
+    if ID_VERSION in legacy:
+        legacy.remove(ID_VERSION)
+    for version in legacy:
+        if not fingerprint_available(version):
+            log.warning(f"ID записів: хеш {version} недоступний — ID цієї версії не перенесуться")
+
+
+def legacy_versions(state: dict) -> list:
+    return [v for v in state["id_legacy"] if fingerprint_available(v)]
 
 
 def current_week() -> int:
@@ -79,28 +871,1296 @@ def is_friday() -> bool:
     return datetime.now(timezone.utc).weekday() == 4  # 0=пн, 4=пт
 
 
+# ── HTTP ──────────────────────────────────────────────────────────────────────
+
+_session = None
+_http_stats = {"requests": 0, "new": 0}
+_stats_lock = threading.Lock()  # лічильники оновлюються з потоків завантаження
+
+
+def _bump(key: str) -> None:
+    with _stats_lock:
+        _http_stats[key] += 1
+
+
+class _CountingHTTPConnection(urllib3.connection.HTTPConnection):
+    def connect(self):
+        _bump("new")
+        super().connect()
+
+
+class _CountingHTTPSConnection(urllib3.connection.HTTPSConnection):
+    def connect(self):
+        _bump("new")
+        super().connect()
+
+
+class _CountingHTTPPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter, який рахує запити і реальні TCP/TLS-підключення."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _CountingHTTPPool, "https": _CountingHTTPSPool}
+
+    def send(self, request, **kwargs):
+        _bump("requests")
+        return super().send(request, **kwargs)
+
+
+def get_session() -> requests.Session:
+    """Спільна сесія для всіх запитів — з'єднання перевикористовуються між викликами."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = PooledAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def connection_stats() -> dict:
+    """Скільки запитів пішло новим з'єднанням, а скільки — вже відкритим (keep-alive)."""
+    with _stats_lock:
+        stats = dict(_http_stats)
+    stats["reused"] = max(stats["requests"] - stats["new"], 0)
+    return stats
+
+
+# ── Умовні запити (ETag / Last-Modified) і хеш вмісту ────────────────────────
+
+_cache_stats = {"not_modified": 0, "same_hash": 0, "bytes_saved": 0, "ms_saved": 0.0}
+
+
+def body_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class TableEndWatcher:
+    """
+    Watcher для деревних бекендів: лише помічає кінець першої <table> за
+    глибиною <table>/</table> у тексті, без розбору HTML — таблицю все одно
+    розбиратиме бекенд, а StreamExtractor на тому ж тексті вдесятеро повільніший
+    за selectolax. Вміст <script>, <style> і коментарів пропускається; тег,
+    розрізаний між частинами, дочитується з хвоста попередньої.
+    """
+
+    SKIP_TO = {"<script": "</script", "<style": "</style", "<!--": "-->"}
+    MARKERS = ("<table", "</table", *SKIP_TO)
+
+    def __init__(self):
+        self.depth = 0
+        self.done = False
+        self._skip = None   # кінець script / style / коментаря, до якого пропускаємо
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        if self.done:
+            return
+        text = (self._tail + text).lower()
+        pos = 0
+        while True:
+            if self._skip:
+                end = text.find(self._skip, pos)
+                if end < 0:
+                    break
+                pos, self._skip = end + len(self._skip), None
+                continue
+            found = [(i, marker) for marker in self.MARKERS for i in (text.find(marker, pos),) if i >= 0]
+            if not found:
+                break
+            i, marker = min(found)
+            pos = i + len(marker)
+            if marker == "<table":
+                self.depth += 1
+            elif marker == "</table":
+                if self.depth:
+                    self.depth -= 1
+                    if not self.depth:
+                        self.done = True
+                        return
+            else:
+                self._skip = self.SKIP_TO[marker]
+        # Маркер, що не вмістився в частину, знайдеться разом з наступною
+        self._tail = text[max(pos, len(text) - len("</script") + 1):]
+
+
+def read_body(resp, watcher=None):
+    """
+    Читає тіло відповіді частинами, не більше MAX_BODY_BYTES. Якщо задано
+    watcher (StreamExtractor або TableEndWatcher), декодовані частини одразу подаються йому, і
+    читання зупиняється, щойно watcher.done — решта сторінки (футер)
+    не завантажується і не декодується. Повертає (байти, текст).
+    """
+    # Без watcher читатимемо до кінця — тож завелику відповідь відкидаємо одразу
+    length = resp.headers.get("Content-Length", "")
+    if watcher is None and length.isdigit() and int(length) > MAX_BODY_BYTES:
+        raise ValueError(f"відповідь {length} байт — більше за MAX_BODY_BYTES={MAX_BODY_BYTES}")
+
+    decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    body, text, size = [], [], 0
+    for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError(f"відповідь більша за MAX_BODY_BYTES={MAX_BODY_BYTES}")
+        body.append(chunk)
+        text.append(decoder.decode(chunk))
+        if watcher is not None:
+            watcher.feed(text[-1])
+            if watcher.done:
+                log.info(f"{resp.url}: потрібне знайдено після {size} байт — решту не завантажуємо")
+                break
+    else:
+        text.append(decoder.decode(b"", final=True))
+    return b"".join(body), "".join(text)
+
+
+def fetch_page(url: str, entry: dict, watcher=None):
+    """
+    GET з If-None-Match / If-Modified-Since за збереженими валідаторами (entry).
+    Повертає (відповідь, байти тіла, текст); якщо сторінка не змінилась (сервер
+    відповів 304 або sha256 тіла збігся з минулим запуском) — (відповідь, None,
+    None), і валідатори з неї беруться в http_cache (refreshed_entry). FORCE_PARSE
+    вимикає обидві перевірки. watcher — див. read_body (лише при STREAM_FETCH).
+    Стан не змінює — викликається з потоків завантаження.
+    """
+    if FORCE_PARSE:
+        entry = {}
+    headers = dict(HEADERS)
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    started = time.perf_counter()
+    timeout = min(FETCH_TIMEOUT, time_left())
+    if timeout <= 0:
+        raise DeadlineExceeded(f"{url}: час запуску вичерпано (RUN_DEADLINE={RUN_DEADLINE:.0f} с)")
+    with get_session().get(url, headers=headers, timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with _stats_lock:
+                _cache_stats["not_modified"] += 1
+                _cache_stats["bytes_saved"]  += entry.get("bytes", 0)
+                _cache_stats["ms_saved"]     += max(entry.get("ms", 0) - elapsed_ms, 0)
+            log.info(f"{url}: 304 Not Modified")
+            return resp, None, None
+        resp.raise_for_status()
+        body, text = read_body(resp, watcher if STREAM_FETCH else None)
+
+    if entry.get("sha256") and entry["sha256"] == body_hash(body):
+        # Валідаторів немає або вони «нечесні», але вміст той самий — парсити нема чого
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _stats_lock:
+            _cache_stats["same_hash"] += 1
+            _cache_stats["ms_saved"]  += max(entry.get("ms", 0) - elapsed_ms, 0)
+        log.info(f"{url}: вміст не змінився (sha256 збігається)")
+        return resp, None, None
+    return resp, body, text
+
+
+def page_entry(resp, body: bytes, started: float) -> dict:
+    """Валідатори і «ціна» повної обробки сторінки (байти, мс) — для http_cache у стані."""
+    return {
+        "etag":          resp.headers.get("ETag", ""),
+        "last_modified": resp.headers.get("Last-Modified", ""),
+        "bytes":         len(body),
+        "sha256":        body_hash(body),
+        "ms":            round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def refreshed_entry(entry: dict, resp) -> dict:
+    """
+    Запис http_cache для незміненої сторінки: вміст і «ціна» ті самі, а
+    валідатори — з останньої відповіді. Інакше, якщо сервер змінив ETag при
+    тому самому вмісті, старий ETag надсилався б щоразу і 304 вже не було б.
+    """
+    return dict(
+        entry,
+        etag=resp.headers.get("ETag") or entry.get("etag", ""),
+        last_modified=resp.headers.get("Last-Modified") or entry.get("last_modified", ""),
+    )
+
+
+# ── Повтори ───────────────────────────────────────────────────────────────────
+
+_run_started = time.monotonic()
+_retry_stats = {}  # джерело -> {"attempts": n, "outcome": "ok" | "помилка" | "дедлайн", "errors": [...]}
+
+
+class DeadlineExceeded(Exception):
+    """Нова спроба не вкладається в RUN_DEADLINE."""
+
+
+def time_left() -> float:
+    return RUN_DEADLINE - (time.monotonic() - _run_started)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Мережеві збої, таймаути, 429 і 5xx — тимчасові; решта (4xx, завелика відповідь) — ні."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """«Full jitter»: випадкова затримка в [0, base·2^n], але не менше Retry-After від сервера."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), RETRY_MAX_DELAY))
+    return delay
+
+
+def with_retries(name: str, fn, *args):
+    """
+    Викликає fn(*args) до RETRY_ATTEMPTS разів, поки помилка тимчасова і
+    наступна спроба встигає до RUN_DEADLINE. Підсумок — у _retry_stats[name].
+    """
+    stats = _retry_stats.setdefault(name, {"attempts": 0, "outcome": "", "errors": []})
+    for attempt in range(RETRY_ATTEMPTS):
+        stats["attempts"] += 1
+        try:
+            result = fn(*args)
+            stats["outcome"] = "ok"
+            return result
+        except Exception as e:
+            stats["errors"].append(str(e))
+            if isinstance(e, DeadlineExceeded):
+                stats["outcome"] = "дедлайн"
+                raise
+            if not is_retryable(e) or attempt == RETRY_ATTEMPTS - 1:
+                stats["outcome"] = "помилка"
+                raise
+            delay = retry_delay(attempt, e)
+            if delay >= time_left():
+                stats["outcome"] = "дедлайн"
+                raise
+            log.warning(f"{name}: спроба {attempt + 1}/{RETRY_ATTEMPTS} невдала ({e}) — повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+
 # ── Telegram ──────────────────────────────────────────────────────────────────
 
-def send_telegram(text: str) -> None:
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    r = requests.post(url, json={"chat_id": CHAT_ID, "text": text, "parse_mode": "HTML"}, timeout=15)
-    r.raise_for_status()
+class TelegramRetryAfter(Exception):
+    """Telegram відповів 429 — повторити не раніше ніж через retry_after секунд."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 Too Many Requests, retry_after={retry_after}")
+        self.retry_after = retry_after
+
+
+def telegram_api(method: str, payload: dict) -> dict:
+    """Виклик Bot API. 429 → TelegramRetryAfter; інші помилки → HTTPError з описом від Telegram."""
+    url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_TOKEN}/{method}"
+    r = get_session().post(url, json=payload, timeout=TELEGRAM_TIMEOUT)
+    if r.status_code == 429:
+        try:
+            retry_after = float(r.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            retry_after = float(r.headers.get("Retry-After", "1") or 1)
+        raise TelegramRetryAfter(retry_after)
+    if r.status_code >= 400:
+        try:
+            description = r.json().get("description", "")
+        except ValueError:
+            description = r.reason
+        raise requests.HTTPError(f"{r.status_code} {description}", response=r)
+    return r.json().get("result", {})
+
+
+# Опис помилки 400, за яким недоступний увесь чат, а не одне повідомлення
+# (на відміну від «message is too long», «can't parse entities» тощо)
+CHAT_GONE_ERRORS = ("chat not found", "bot was blocked", "user is deactivated")
+
+
+def chat_unreachable(error: Exception) -> bool:
+    """403 або 400 «chat not found» / «bot was blocked» / «user is deactivated»."""
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return False
+    status = error.response.status_code
+    return status == 403 or (status == 400 and any(s in str(error).lower() for s in CHAT_GONE_ERRORS))
+
+
+def message_rejected(error: Exception) -> bool:
+    """
+    Telegram відхилив саме це повідомлення (4xx: завелике, зламаний HTML…) —
+    повтор не допоможе. 401/404 — невірний токен чи TELEGRAM_API_BASE, а не
+    вада повідомлення; недоступний чат — див. chat_unreachable().
+    """
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return False
+    status = error.response.status_code
+    return 400 <= status < 500 and status not in (401, 404, 429) and not chat_unreachable(error)
+
+
+def send_telegram(text: str, chat_id: str, silent: bool = False) -> dict:
+    payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+    if silent:
+        payload["disable_notification"] = True
+    result = telegram_api("sendMessage", payload)
     log.info("Telegram надіслано.")
+    return result
+
+
+def upsert_live_message(item: dict) -> dict:
+    """
+    Живе повідомлення зі станом наявності: редагуємо наявне (editMessageText),
+    а якщо його немає або його видалили — надсилаємо нове і закріплюємо.
+    Нове в тихі години чату надсилається без звуку (редагування звуку не дає).
+    """
+    if item.get("message_id"):
+        try:
+            telegram_api("editMessageText", {
+                "chat_id": item["chat_id"], "message_id": item["message_id"],
+                "text": item["text"], "parse_mode": "HTML", "disable_web_page_preview": True,
+            })
+            log.info(f"Telegram: живе повідомлення в чаті {item['chat_id']} оновлено.")
+            return {"message_id": item["message_id"]}
+        except requests.HTTPError as e:
+            if "message is not modified" in str(e):
+                return {"message_id": item["message_id"]}
+            if "message to edit not found" not in str(e) and "message can't be edited" not in str(e):
+                raise
+            log.info(f"Telegram: живе повідомлення в чаті {item['chat_id']} зникло — створюємо нове")
+    silent = any(in_quiet_hours(r) for r in RECIPIENTS if r["chat_id"] == item["chat_id"])
+    result = send_telegram(item["text"], item["chat_id"], silent)
+    try:
+        telegram_api("pinChatMessage", {
+            "chat_id": item["chat_id"], "message_id": result["message_id"], "disable_notification": True,
+        })
+    except Exception as e:
+        # У групі бот може не мати права закріплювати — повідомлення все одно оновлюватиметься
+        log.warning(f"Telegram: не вдалося закріпити живе повідомлення в чаті {item['chat_id']}: {e}")
+    return result
+
+
+def deliver(item: dict) -> dict:
+    if item.get("kind") == "live":
+        return upsert_live_message(item)
+    return send_telegram(item["text"], item["chat_id"])
+
+
+class TokenBucket:
+    """rate токенів за секунду, не більше burst про запас. Без власного замка — див. Dispatcher."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Наступний токен — не раніше ніж через seconds (після 429)."""
+        self.wait_time()
+        self.tokens = min(self.tokens, 1) - seconds * self.rate
+
+
+class Dispatcher:
+    """
+    Черга сповіщень з кількома потоками-відправниками. submit() не блокує:
+    перевірка наступного джерела йде, поки попередні повідомлення відправляються.
+
+    Ліміти Telegram дотримуються двома token bucket — загальним і окремим на
+    кожен чат. Якщо токена немає, повідомлення відкладається таймером, а потік
+    береться за наступне (інший чат не чекає). На 429 повідомлення повертається
+    в чергу через retry_after з відповіді; інші тимчасові помилки — з backoff.
+
+    Стан потоки не чіпають: підсумок кожного повідомлення ("sent" / "failed",
+    ключ, результат API) потрапляє в self.results, а застосовує його до outbox
+    головний потік — див. apply_deliveries().
+
+    Живе повідомлення (kind="live") чату в черзі не лежить: у черзі — лише
+    «слот» чату, а потік, узявши його, бере останню версію з self._live. Так
+    для чату відправляється щонайбільше одна версія за раз, а застаріла
+    (з outbox минулого запуску чи замінена до відправки) не відправляється.
+    """
+
+    def __init__(self, workers: int = TG_WORKERS):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._global = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self._chats = {}
+        self._dead = {}   # чат -> помилка: бота заблоковано, чат не існує (chat_unreachable) — до кінця запуску не пробуємо
+        self._live = {}        # чат -> остання ще не взята версія живого повідомлення
+        self._live_busy = set()  # чати, слот яких у черзі або відправляється
+        self._live_ids = {}    # чат -> message_id живого повідомлення, отриманий цього запуску
+        self.results = queue.Queue()
+        self.stats = {"sent": 0, "rate_limited": 0, "retried": 0, "failed": 0}
+        self.sent_by_priority = {}
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def submit(self, item: dict) -> None:
+        """item: {"key", "chat_id", "text", "priority"} — копія запису з outbox."""
+        with self._lock:
+            self._pending += 1
+        item = dict(item, attempts=0)
+        if item.get("kind") == "live":
+            with self._lock:
+                if item["chat_id"] in self._live:
+                    self._pending -= 1  # невзяту версію замінює новіша
+                self._live[item["chat_id"]] = item
+                if item["chat_id"] in self._live_busy:
+                    return
+                self._live_busy.add(item["chat_id"])
+            item = live_slot(item)
+        self._put(item)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+
+    def _put(self, item: dict, delay: float = 0) -> None:
+        # Черга впорядкована за (пріоритет, порядок надходження): термінове
+        # повідомлення береться першим вільним потоком, навіть якщо позаду
+        # нього стоять сотні оновлень кількості
+        entry = (item.get("priority", PRIORITY_QUANTITY), next(self._seq), item)
+        if delay > 0:
+            timer = threading.Timer(delay, self._queue.put, (entry,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._queue.put(entry)
+
+    def _retry(self, item: dict, delay: float) -> None:
+        """Повертає повідомлення в чергу через delay; живе — у свій слот, якщо новішого там ще немає."""
+        if item.get("kind") == "live":
+            with self._lock:
+                if item["chat_id"] in self._live:
+                    self._pending -= 1
+                else:
+                    self._live[item["chat_id"]] = item
+            item = live_slot(item)
+        self._put(item, delay)
+
+    def _reserve(self, chat_id: str) -> float:
+        """0 — можна відправляти (токени списано); інакше — скільки чекати."""
+        with self._lock:
+            chat = self._chats.setdefault(chat_id, TokenBucket(TG_CHAT_RATE, TG_CHAT_BURST))
+            wait = max(chat.wait_time(), self._global.wait_time())
+            if wait == 0:
+                chat.take()
+                self._global.take()
+            return wait
+
+    def _finish(self, outcome: str, item: dict, result) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+            self._pending -= 1
+            if outcome == "sent":
+                priority = item.get("priority", PRIORITY_QUANTITY)
+                self.sent_by_priority[priority] = self.sent_by_priority.get(priority, 0) + 1
+                if item.get("kind") == "live":
+                    self._live_ids[item["chat_id"]] = result["message_id"]
+        self.results.put((outcome, item, result))
+        if item.get("kind") == "live":
+            with self._lock:
+                if item["chat_id"] not in self._live:
+                    self._live_busy.discard(item["chat_id"])
+                    return
+            self._put(live_slot(item))
+
+    def _work(self) -> None:
+        while True:
+            _, _, item = self._queue.get()
+            if item is None:
+                return
+            if item.get("slot"):
+                with self._lock:
+                    item = self._live.pop(item["chat_id"])
+                    # Попередня версія могла щойно створити повідомлення — редагуємо його
+                    item["message_id"] = self._live_ids.get(item["chat_id"], item.get("message_id"))
+            if item["chat_id"] in self._dead:
+                self._finish("failed", item, self._dead[item["chat_id"]])
+                continue
+            wait = self._reserve(item["chat_id"])
+            if wait > 0:
+                self._retry(item, wait)
+                continue
+            item["attempts"] += 1
+            try:
+                self._finish("sent", item, deliver(item))
+            except TelegramRetryAfter as e:
+                log.warning(f"Telegram: ліміт для чату {item['chat_id']} — повтор через {e.retry_after:.1f} с")
+                item["attempts"] -= 1   # 429 — не збій, спроб не витрачає
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                    self._chats[item["chat_id"]].pause(e.retry_after)
+                self._retry(item, e.retry_after)
+            except Exception as e:
+                if is_retryable(e) and item["attempts"] < RETRY_ATTEMPTS:
+                    with self._lock:
+                        self.stats["retried"] += 1
+                    self._retry(item, retry_delay(item["attempts"], e))
+                else:
+                    log.error(f"Telegram помилка (чат {item['chat_id']}): {e}")
+                    if chat_unreachable(e):
+                        # Чат недоступний — решта його повідомлень лишається в outbox,
+                        # а потоки не витрачають на нього час і займаються іншими чатами
+                        self._dead[item["chat_id"]] = str(e)
+                    elif message_rejected(e):
+                        item["rejected"] = True  # apply_deliveries() прибере його з outbox
+                    self._finish("failed", item, str(e))
+
+
+def live_slot(item: dict) -> dict:
+    return {"slot": True, "chat_id": item["chat_id"], "priority": item.get("priority", PRIORITY_QUANTITY)}
+
+
+_dispatcher = None
+
+
+def get_dispatcher() -> Dispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher()
+    return _dispatcher
+
+
+# ── Outbox: надійна доставка ─────────────────────────────────────────────────
+# Кожне повідомлення спершу потрапляє в state["outbox"] і зберігається разом з
+# рештою стану; з outbox воно зникає лише після успішної відповіді API.
+# Невідправлене (помилка, дедлайн, падіння процесу) відправляється першим на
+# наступному запуску. Ключ ідемпотентності — хеш (чат, текст): доставлені ключі
+# живуть у state["delivered"] DELIVERED_TTL_DAYS днів, і повторно такий самий
+# текст у той самий чат не ставиться. Доставка — «щонайменше раз»: якщо процес
+# упав між відповіддю Telegram і збереженням стану, повідомлення піде ще раз.
+# Повідомлення, яке Telegram відхилив (message_rejected), з outbox видаляється.
+
+def message_key(chat_id: str, text: str) -> str:
+    return hashlib.sha256(f"{chat_id}\n{text}".encode()).hexdigest()[:32]
+
+
+def enqueue(state: dict, text: str, chat_id: str, priority: int = PRIORITY_QUANTITY) -> bool:
+    """Ставить повідомлення в outbox і в чергу відправки. False — дублікат."""
+    key = message_key(chat_id, text)
+    if key in state["delivered"] or any(item["key"] == key for item in state["outbox"]):
+        log.info(f"Outbox: повідомлення {key[:8]} вже доставлене або в черзі — пропускаємо")
+        return False
+    item = {
+        "key": key, "chat_id": chat_id, "text": text, "priority": priority,
+        "runs": 1, "created": int(time.time()),
+    }
+    state["outbox"].append(item)
+    get_dispatcher().submit(item)
+    return True
+
+
+def enqueue_live(state: dict, text: str, digest: str, chat_id: str,
+                 priority: int = PRIORITY_QUANTITY) -> bool:
+    """
+    Оновлення живого повідомлення. Ставиться, лише якщо таблиця змінилась
+    (digest інший, ніж у state["live_status"]); попереднє недоставлене
+    оновлення для цього чату в outbox замінюється новим.
+    """
+    live = state["live_status"].get(chat_id, {})
+    if live.get("hash") == digest:
+        return False
+    state["outbox"] = [
+        i for i in state["outbox"] if not (i.get("kind") == "live" and i["chat_id"] == chat_id)
+    ]
+    item = {
+        "key": message_key(chat_id, text), "kind": "live", "chat_id": chat_id, "text": text,
+        "priority": priority, "hash": digest, "message_id": live.get("message_id"), "runs": 1, "created": int(time.time()),
+    }
+    state["outbox"].append(item)
+    get_dispatcher().submit(item)
+    return True
+
+
+def flush_outbox(state: dict) -> None:
+    """На старті: спершу — те, що не доставили минулого разу."""
+    keep = []
+    for item in state["outbox"]:
+        if item["runs"] >= OUTBOX_MAX_RUNS:
+            log.error(f"Outbox: {item['key'][:8]} не доставлено за {item['runs']} запусків — відкидаємо")
+            continue
+        item["runs"] += 1
+        keep.append(item)
+    state["outbox"] = keep
+    if keep:
+        log.info(f"Outbox: {len(keep)} недоставлених повідомлень з минулих запусків — відправляємо в черзі пріоритетів")
+    for item in keep:
+        get_dispatcher().submit(item)
+
+
+def apply_deliveries(state: dict, timeout: float = 0) -> int:
+    """
+    Головний потік: застосовує підсумки відправки до outbox і одразу зберігає
+    стан — щоб після падіння повторилось якомога менше доставленого. Чекає перший
+    підсумок не довше timeout. Повертає, скільки підсумків оброблено.
+    """
+    if _dispatcher is None:
+        return 0
+    done = 0
+    while True:
+        try:
+            outcome, item, result = _dispatcher.results.get(timeout=timeout if not done else 0)
+        except queue.Empty:
+            break
+        done += 1
+        stats = state["recipients"].setdefault(
+            item["chat_id"], {"delivered": 0, "failed": 0, "failed_in_row": 0, "last_error": ""}
+        )
+        if outcome == "sent":
+            if item.get("kind") == "live":
+                state["live_status"][item["chat_id"]] = {"message_id": result["message_id"], "hash": item["hash"]}
+                # Новіша версія, що чекає (зокрема до наступного запуску), редагує це повідомлення
+                for i in state["outbox"]:
+                    if i.get("kind") == "live" and i["chat_id"] == item["chat_id"]:
+                        i["message_id"] = result["message_id"]
+            else:
+                state["delivered"][item["key"]] = int(time.time())
+            state["outbox"] = [i for i in state["outbox"] if i["key"] != item["key"]]
+            stats["delivered"] += 1
+            stats["failed_in_row"] = 0
+        else:
+            stats["failed"] += 1
+            stats["failed_in_row"] += 1
+            stats["last_error"] = result
+            if item.get("rejected"):
+                log.error(f"Outbox: Telegram відхилив {item['key'][:8]} (чат {item['chat_id']}) — відкидаємо")
+                state["outbox"] = [i for i in state["outbox"] if i["key"] != item["key"]]
+    if done:
+        save_state(state)
+    return done
+
+
+def finish_deliveries(state: dict) -> int:
+    """Чекає відправки до RUN_DEADLINE (але хоча б TELEGRAM_TIMEOUT). Повертає, скільки лишилось."""
+    if _dispatcher is None:
+        return 0
+    deadline = time.monotonic() + max(time_left(), TELEGRAM_TIMEOUT)
+    while _dispatcher.pending and time.monotonic() < deadline:
+        apply_deliveries(state, timeout=min(1.0, max(deadline - time.monotonic(), 0)))
+    apply_deliveries(state)
+    _dispatcher.stop()
+    cutoff = time.time() - DELIVERED_TTL_DAYS * 86400
+    state["delivered"] = {k: ts for k, ts in state["delivered"].items() if ts >= cutoff}
+    return len(state["outbox"])
+
+
+# ── Шаблони повідомлень ──────────────────────────────────────────────────────
+# Тексти — string.Template, компілюються один раз при імпорті. Усі поля
+# (зі сторінок ЄЛіки / НІР) екрануються html.escape: символи < > & у назві
+# лікарні інакше ламають parse_mode=HTML. Мова — поле "lang" одержувача;
+# якщо шаблону в потрібній мові немає, береться український.
+# Одні й ті самі запис + мова рендеряться один раз (lru_cache) — скільки б
+# чатів не отримували повідомлення.
+
+TEMPLATE_TEXTS = {
+    "uk": {
+        "eliky_new": (
+            "💊 <b>АБІРАТЕРОН — ЄЛіки (нова лікарня)</b>\n\n"
+            "🏥 <b>Лікарня:</b> $hospital\n"
+            "📍 <b>Область:</b> $region\n"
+            "💊 <b>Кількість:</b> $quantity\n"
+            "📅 <b>Дата оновлення:</b> $date\n\n"
+            "🔗 <a href='$url'>Переглянути на ЄЛіки</a>"
+        ),
+        "eliky_quantity": (
+            "💊 <b>АБІРАТЕРОН — ЄЛіки (оновлення кількості)</b>\n\n"
+            "🏥 <b>Лікарня:</b> $hospital\n"
+            "📍 <b>Область:</b> $region\n"
+            "💊 <b>Кількість:</b> $quantity\n"
+            "📅 <b>Дата оновлення:</b> $date\n\n"
+            "🔗 <a href='$url'>Переглянути на ЄЛіки</a>"
+        ),
+        "eliky_coalesced": (
+            "💊 <b>АБІРАТЕРОН — ЄЛіки (оновлення кількості)</b>\n\n"
+            "🏥 <b>Лікарня:</b> $hospital\n"
+            "📍 <b>Область:</b> $region\n"
+            "💊 <b>Кількість:</b> $quantity\n"
+            "📅 <b>Дата оновлення:</b> $date\n"
+            "🔁 <b>Змін за $minutes хв:</b> $changes, показано останню\n\n"
+            "🔗 <a href='$url'>Переглянути на ЄЛіки</a>"
+        ),
+        "unci_record": (
+            "🏥 <b>АБІРАТЕРОН — НІР (новий запис)</b>\n\n"
+            "💊 <b>Назва:</b> $name\n"
+            "🧪 <b>Діюча речовина:</b> $subst\n"
+            "📦 <b>Приміщення:</b> $storage\n"
+            "🔢 <b>Кількість:</b> $quantity $unit\n"
+            "📅 <b>Термін придатності:</b> $expiry\n"
+            "💉 <b>Форма випуску:</b> $form\n"
+            "🔖 <b>Партія:</b> $batch\n"
+            "🗓 <b>Дата оновлення НІР:</b> $update_date\n\n"
+            "🔗 <a href='$url'>Переглянути на сайті НІР</a>"
+        ),
+        "unci_notice": (
+            "🏥 <b>НІР — сторінку оновлено</b>\n\n"
+            "🗓 <b>Нова дата:</b> $update_date\n"
+            "❌ Абіратерону у списку <b>не знайдено</b>\n\n"
+            "🔗 <a href='$url'>Переглянути</a>"
+        ),
+        "live_head": "💊 <b>АБІРАТЕРОН — наявність у ЄЛіки</b>\n\n",
+        "live_row": "🏥 <b>$hospital</b> ($region) — $quantity, $date",
+        "live_empty": "❌ Зараз записів немає",
+        "live_more": "… і ще $count",
+        "live_tail": "\n\n🕒 Перевірено: $checked UTC\n🔗 <a href='$url'>Переглянути на ЄЛіки</a>",
+        "deferred_head": "🌅 <b>Поки діяли тихі години</b> — сповіщень: $count",
+    },
+    "en": {
+        "eliky_new": (
+            "💊 <b>ABIRATERONE — eLiky (new hospital)</b>\n\n"
+            "🏥 <b>Hospital:</b> $hospital\n"
+            "📍 <b>Region:</b> $region\n"
+            "💊 <b>Quantity:</b> $quantity\n"
+            "📅 <b>Updated:</b> $date\n\n"
+            "🔗 <a href='$url'>Open on eLiky</a>"
+        ),
+        "eliky_quantity": (
+            "💊 <b>ABIRATERONE — eLiky (quantity update)</b>\n\n"
+            "🏥 <b>Hospital:</b> $hospital\n"
+            "📍 <b>Region:</b> $region\n"
+            "💊 <b>Quantity:</b> $quantity\n"
+            "📅 <b>Updated:</b> $date\n\n"
+            "🔗 <a href='$url'>Open on eLiky</a>"
+        ),
+        "eliky_coalesced": (
+            "💊 <b>ABIRATERONE — eLiky (quantity update)</b>\n\n"
+            "🏥 <b>Hospital:</b> $hospital\n"
+            "📍 <b>Region:</b> $region\n"
+            "💊 <b>Quantity:</b> $quantity\n"
+            "📅 <b>Updated:</b> $date\n"
+            "🔁 <b>Changes in $minutes min:</b> $changes, showing the latest\n\n"
+            "🔗 <a href='$url'>Open on eLiky</a>"
+        ),
+        "unci_record": (
+            "🏥 <b>ABIRATERONE — National Cancer Institute (new entry)</b>\n\n"
+            "💊 <b>Name:</b> $name\n"
+            "🧪 <b>Active substance:</b> $subst\n"
+            "📦 <b>Storage:</b> $storage\n"
+            "🔢 <b>Quantity:</b> $quantity $unit\n"
+            "📅 <b>Expiry:</b> $expiry\n"
+            "💉 <b>Dosage form:</b> $form\n"
+            "🔖 <b>Batch:</b> $batch\n"
+            "🗓 <b>List updated:</b> $update_date\n\n"
+            "🔗 <a href='$url'>Open the list</a>"
+        ),
+        "unci_notice": (
+            "🏥 <b>National Cancer Institute — list updated</b>\n\n"
+            "🗓 <b>New date:</b> $update_date\n"
+            "❌ Abiraterone <b>not found</b> in the list\n\n"
+            "🔗 <a href='$url'>Open the list</a>"
+        ),
+        "live_head": "💊 <b>ABIRATERONE — availability on eLiky</b>\n\n",
+        "live_row": "🏥 <b>$hospital</b> ($region) — $quantity, $date",
+        "live_empty": "❌ No entries right now",
+        "live_more": "… and $count more",
+        "live_tail": "\n\n🕒 Checked: $checked UTC\n🔗 <a href='$url'>Open on eLiky</a>",
+        "deferred_head": "🌅 <b>While quiet hours were on</b> — notifications: $count",
+    },
+}
+
+TEMPLATES = {
+    lang: {name: Template(text) for name, text in {**TEMPLATE_TEXTS["uk"], **texts}.items()}
+    for lang, texts in TEMPLATE_TEXTS.items()
+}
+
+
+@lru_cache(maxsize=4096)
+def _render(name: str, lang: str, fields: tuple) -> str:
+    return TEMPLATES[lang][name].substitute({key: html.escape(str(value)) for key, value in fields})
+
+
+def render(template: str, lang: str = NOTIFY_LANG, /, **fields) -> str:
+    """Текст шаблону template мовою lang; поля екрануються. Результат кешується."""
+    return _render(template, lang if lang in TEMPLATES else "uk", tuple(sorted(fields.items())))
+
+
+def tg_len(text: str) -> int:
+    """Довжина так, як її рахує Telegram — в UTF-16 одиницях (емодзі = 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def render_block(name: str, lang: str, fields: dict, limit: int = TELEGRAM_MAX_CHARS) -> str:
+    """
+    render() блоку, що влізе в одне повідомлення: якщо текст довший за limit
+    (Telegram відхилить його з 400), найдовше поле обрізається з «…». Ріжеться
+    значення поля, а не готовий HTML — теги й сутності лишаються цілими.
+    """
+    text = render(name, lang, **fields)
+    while tg_len(text) > limit:
+        key = max(fields, key=lambda k: len(str(fields[k])))
+        value = str(fields[key])
+        if len(value) <= 1:
+            break
+        # Найдовший префікс, з яким блок влізе (екранування змінює довжину — тому пошуком)
+        lo, hi = 0, len(value) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if tg_len(render(name, lang, **dict(fields, **{key: value[:mid] + "…"}))) <= limit:
+                lo = mid
+            else:
+                hi = mid - 1
+        fields = dict(fields, **{key: value[:lo] + "…"})
+        text = render(name, lang, **fields)
+    return text
+
+
+def pack_digest(blocks: list, limit: int = TELEGRAM_MAX_CHARS, sep: str = DIGEST_SEPARATOR) -> list:
+    """
+    Пакує блоки (по одному на запис) у якомога менше повідомлень не довших
+    за limit. Блоки не розриваються; довші за limit мають бути вже обрізані
+    (render_block) — інакше такий блок піде окремим повідомленням як є.
+    """
+    messages, current, size = [], [], 0
+    for block in blocks:
+        extra = tg_len(block) + (tg_len(sep) if current else 0)
+        if current and size + extra > limit:
+            messages.append(sep.join(current))
+            current, size = [], 0
+            extra = tg_len(block)
+        current.append(block)
+        size += extra
+    if current:
+        messages.append(sep.join(current))
+    return messages
+
+
+def notify(state: dict, blocks: list, priority: int) -> None:
+    """
+    blocks — [(шаблон, поля)], по одному на запис.
+    NOTIFY_MODE=digest — блоки пакуються в мінімум повідомлень; single — повідомлення на блок.
+    Усі блоки одного виклику — одного класу priority: термінове не склеюється з рутинним.
+    """
+    if not blocks:
+        return
+    by_lang = {}
+    for recipient in RECIPIENTS:
+        if in_quiet_hours(recipient) and not (priority == PRIORITY_URGENT and QUIET_URGENT_BYPASS):
+            defer(state, recipient["chat_id"], blocks, priority)
+            continue
+        by_lang.setdefault(recipient["lang"], []).append(recipient["chat_id"])
+    # Текст готується один раз на мову, а доставляється кожному одержувачу
+    # окремо: свій запис в outbox, свій ліміт, свої помилки
+    for lang, chats in by_lang.items():
+        enqueue_blocks(state, blocks, lang, chats, priority)
+
+
+def enqueue_blocks(state: dict, blocks: list, lang: str, chats: list, priority: int,
+                   digest: bool = NOTIFY_MODE == "digest") -> None:
+    texts = [render_block(name, lang, fields) for name, fields in blocks]
+    messages = pack_digest(texts) if digest else texts
+    if digest and len(texts) > 1:
+        log.info(f"Telegram ({lang}): {len(texts)} записів упаковано в {len(messages)} повідомлень")
+    for text in messages:
+        for chat_id in chats:
+            enqueue(state, text, chat_id, priority)
+
+
+# ── Тихі години ──────────────────────────────────────────────────────────────
+# Поки в чаті тихі години, блоки (шаблон + поля, ще не відрендерені) чекають
+# у state["deferred"]. Першого запуску після їх кінця все накопичене йде одним
+# дайджестом — незалежно від NOTIFY_MODE, найважливіше першим.
+
+def in_quiet_hours(recipient: dict, now: datetime = None) -> bool:
+    if not recipient["quiet"]:
+        return False
+    start, end = recipient["quiet"]
+    hour = (now or datetime.now(QUIET_TZ)).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def defer(state: dict, chat_id: str, blocks: list, priority: int) -> None:
+    waiting = state["deferred"].setdefault(chat_id, [])
+    for name, fields in blocks:
+        item = {"priority": priority, "block": [name, fields]}
+        if item not in waiting:
+            waiting.append(item)
+    log.info(f"Тихі години в чаті {chat_id}: відкладено {len(blocks)} (усього {len(waiting)})")
+
+
+def flush_deferred(state: dict) -> None:
+    recipients = {r["chat_id"]: r for r in RECIPIENTS}
+    for chat_id in list(state["deferred"]):
+        recipient = recipients.get(chat_id)
+        if recipient is None:
+            log.warning(f"Тихі години: чату {chat_id} немає в CHAT_ID — відкладене відкидаємо")
+            del state["deferred"][chat_id]
+            continue
+        if in_quiet_hours(recipient):
+            continue
+        items = sorted(state["deferred"].pop(chat_id), key=lambda item: item["priority"])
+        log.info(f"Тихі години в чаті {chat_id} скінчились — {len(items)} відкладених одним дайджестом")
+        blocks = [("deferred_head", {"count": len(items)})] + [tuple(item["block"]) for item in items]
+        enqueue_blocks(state, blocks, recipient["lang"], [chat_id], items[0]["priority"], digest=True)
+
+
+# ── HTML-парсери ─────────────────────────────────────────────────────────────
+# Обидва джерела потребують одного й того самого: рядки першої таблиці (текст
+# клітинок) і, для НІР, текстовий вузол з датою оновлення. Бекенд обирається
+# при старті: selectolax → lxml → stream (stdlib, без bs4) → html.parser (bs4),
+# залежно від того, що встановлено.
+#
+# Розташування текстового вузла описується «шляхом»: індекси серед дочірніх
+# елементів від кореня до батька вузла + номер вузла серед його текстових дітей.
+# Шлях залежить від бекенда (lxml, наприклад, сам додає <html>/<body>).
+
+class Bs4Backend:
+    """BeautifulSoup з указаним парсером (html.parser або lxml)."""
+
+    def __init__(self, features: str):
+        self.name = features
+        self.features = features
+
+    def parse(self, html: str, scoped: bool = False):
+        from bs4 import BeautifulSoup, SoupStrainer
+        # scoped — SoupStrainer будує дерево лише з <table>, решта сторінки
+        # (меню, скрипти, футер) в пам'ять не потрапляє
+        if scoped:
+            return BeautifulSoup(html, self.features, parse_only=SoupStrainer("table"))
+        return BeautifulSoup(html, self.features)
+
+    def table_rows(self, doc):
+        table = doc.find("table")
+        if not table:
+            return None
+        if self.features == "html.parser":
+            # html.parser не закриває <td>/<tr> неявно: з <td>a<td>b виходять
+            # вкладені клітинки («ab», «b»). Рядки беремо StreamExtractor'ом із
+            # серіалізованої таблиці — він закриває їх так само, як lxml і selectolax.
+            # Для рядків без </td> чи </tr> це не те, що давав get_text до появи
+            # бекендів: такі записи після оновлення один раз отримали нові ID
+            return StreamExtractor(table=True).feed_all(str(table)).rows
+        return [[c.get_text(strip=True) for c in row.find_all(["td", "th"])] for row in table.find_all("tr")]
+
+    def find_text(self, doc, match):
+        """Перший текстовий вузол, для якого match(text) — (text, шлях) або ("", None)."""
+        for string in doc.find_all(string=True):
+            text = string.strip()
+            if match(text):
+                return text, self._path(string)
+        return "", None
+
+    def text_at(self, doc, path):
+        """Текст вузла за шляхом або None, якщо такого вузла вже немає."""
+        from bs4 import NavigableString, Tag
+        *elements, text_index = path
+        node = doc
+        for i in elements:
+            children = [c for c in node.children if isinstance(c, Tag)]
+            if i >= len(children):
+                return None
+            node = children[i]
+        strings = [c for c in node.children if isinstance(c, NavigableString)]
+        return strings[text_index].strip() if text_index < len(strings) else None
+
+    @staticmethod
+    def _path(string):
+        from bs4 import NavigableString, Tag
+        parent = string.parent
+        path = [[c for c in parent.children if isinstance(c, NavigableString)].index(string)]
+        node = parent
+        while node.parent is not None:
+            path.append([c for c in node.parent.children if isinstance(c, Tag)].index(node))
+            node = node.parent
+        return path[::-1]
+
+
+class SelectolaxBackend:
+    """selectolax (lexbor) — найшвидший з доступних, strip/join як у bs4 get_text(strip=True)."""
+
+    name = "selectolax"
+
+    def parse(self, html: str, scoped: bool = False):
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(html)
+
+    def table_rows(self, doc):
+        table = doc.css_first("table")
+        if table is None:
+            return None
+        return [
+            [c.text(deep=True, separator="", strip=True) for c in row.css("td, th")]
+            for row in table.css("tr")
+        ]
+
+    def find_text(self, doc, match):
+        for node in doc.root.traverse(include_text=True):
+            if node.tag == "-text":
+                text = node.text_content.strip()
+                if match(text):
+                    return text, self._path(doc, node)
+        return "", None
+
+    def text_at(self, doc, path):
+        *elements, text_index = path
+        node = doc.root
+        for i in elements:
+            children = list(node.iter(include_text=False))
+            if i >= len(children):
+                return None
+            node = children[i]
+        strings = [c for c in node.iter(include_text=True) if c.tag == "-text"]
+        return strings[text_index].text_content.strip() if text_index < len(strings) else None
+
+    @staticmethod
+    def _path(doc, text_node):
+        parent = text_node.parent
+        path = [[c for c in parent.iter(include_text=True) if c.tag == "-text"].index(text_node)]
+        node = parent
+        while node != doc.root:
+            path.append(list(node.parent.iter(include_text=False)).index(node))
+            node = node.parent
+        return path[::-1]
+
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+
+class StreamExtractor(HTMLParser):
+    """
+    Подієвий розбір на stdlib html.parser — без дерева і без bs4.
+
+    table=True  — збирає рядки першої <table> у self.rows (текст клітинок
+                  strip/join як у bs4 get_text(strip=True)); після її </table>
+                  self.table_done = True. Як find_all("tr") / find_all("td")
+                  у bs4: рядки вкладених таблиць — окремі рядки, а їхні
+                  клітинки входять і в рядок зовнішньої. Незакриті <td>/<tr>
+                  закриваються наступними, як у браузера (lxml, selectolax).
+    match=fn    — шукає перший текстовий вузол, для якого fn(text) — істина.
+    path=[...]  — шукає текстовий вузол за шляхом (див. коментар вище).
+                  Разом з match шлях перевіряється першим: match (з місця
+                  промаху) — лише якщо вузол за шляхом йому не відповідає.
+    Знайдене кладе в self.found_text / self.found_path; self.found_by —
+    "path" або "match".
+    self.done — усе запитане вже знайдено, далі документ можна не подавати.
+    """
+
+    def __init__(self, table: bool = False, match=None, path=None):
+        super().__init__(convert_charrefs=True)
+        self.table, self.match, self.path = table, match, path
+        self._rows = []              # рядки в порядку <tr>; клітинка — список шматків тексту
+        self.found_text, self.found_path, self.found_by = None, None, None
+        self.table_done = False
+        self._buf = []               # поточний текстовий вузол (handle_data може дробити)
+        self._stack = [[0, 0]]       # на кожен відкритий елемент: [дітей-елементів, дітей-тексту]
+        self._tags = []              # імена відкритих елементів (паралельно _stack[1:])
+        self._path = []              # індекси від кореня до поточного елемента
+        self._levels = []            # на кожну відкриту <table>: [відкритий рядок, відкрита клітинка]
+
+    @property
+    def rows(self) -> list:
+        return [["".join(cell) for cell in row] for row in self._rows]
+
+    @property
+    def done(self) -> bool:
+        table_ok = not self.table or self.table_done
+        text_ok  = not (self.match or self.path) or self.found_path is not None
+        return table_ok and text_ok
+
+    def feed_all(self, html: str, chunk: int = 16384) -> "StreamExtractor":
+        for i in range(0, len(html), chunk):
+            self.feed(html[i:i + chunk])
+            if self.done:
+                return self
+        self.close()
+        return self
+
+    # ── Текст ─────────────────────────────────────────────────────────────────
+
+    def handle_data(self, data):
+        if not self.done:
+            self._buf.append(data)
+
+    def _flush(self):
+        if not self._buf or self.done:
+            self._buf = []
+            return
+        raw = "".join(self._buf)
+        self._buf = []
+        text = raw.strip()
+        index = self._stack[-1][1]
+        self._stack[-1][1] += 1
+        if text:
+            for _, cell in self._levels:
+                if cell is not None:
+                    cell.append(text)
+        if self.found_path is None and self.path:
+            if index == self.path[-1] and self._path == self.path[:-1]:
+                if not self.match or self.match(text):
+                    self.found_text, self.found_path, self.found_by = text, self.path, "path"
+                    return
+                self.path = None  # промах — далі шукає match
+            elif self._past(index):
+                self.path = None  # вузла за шляхом на сторінці вже немає
+        if self.found_path is None and not self.path and self.match and self.match(text):
+            self.found_text, self.found_path, self.found_by = text, self._path + [index], "match"
+
+    def _past(self, index: int) -> bool:
+        """Чи текстовий вузол index поточного елемента стоїть у документі після вузла self.path."""
+        parent = self.path[:-1]
+        for mine, theirs in zip(self._path, parent):
+            if mine != theirs:
+                return mine > theirs
+        return self._path == parent and index > self.path[-1]
+
+    # ── Теги ──────────────────────────────────────────────────────────────────
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if self.done:
+            return
+        index = self._stack[-1][0]
+        self._stack[-1][0] += 1
+        if tag not in VOID_TAGS:
+            self._stack.append([0, 0])
+            self._tags.append(tag)
+            self._path.append(index)
+        if not self.table or self.table_done:
+            return
+        if tag == "table":
+            self._levels.append([None, None])
+        elif self._levels and tag == "tr":
+            level = self._levels[-1]
+            level[:] = [[], None]
+            self._rows.append(level[0])
+        elif self._levels and tag in ("td", "th") and self._levels[-1][0] is not None:
+            cell = []
+            self._levels[-1][1] = cell
+            for row, _ in self._levels:
+                if row is not None:
+                    row.append(cell)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        if not self.done:
+            self._stack[-1][0] += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if self.done:
+            return
+        if tag in self._tags:
+            # закриваємо і всі незакриті всередині (<p><b>…</p>)
+            while self._tags:
+                self._stack.pop()
+                self._path.pop()
+                if self._tags.pop() == tag:
+                    break
+        if not self.table or self.table_done or not self._levels:
+            return
+        if tag == "table":
+            self._levels.pop()
+            self.table_done = not self._levels
+        elif tag in ("td", "th"):
+            self._levels[-1][1] = None
+        elif tag == "tr":
+            self._levels[-1][:] = [None, None]
+
+    def handle_comment(self, data):
+        self._flush()
+
+
+class StreamBackend:
+    """
+    Потоковий бекенд без залежностей. «Документ» — сам HTML: кожен запит
+    (рядки таблиці, пошук дати) — окремий прохід, який зупиняється, щойно
+    знайшов потрібне, тож футер сторінки зазвичай навіть не розбирається.
+    """
+
+    name = "stream"
+
+    def parse(self, html: str, scoped: bool = False):
+        return html
+
+    def table_rows(self, doc):
+        extractor = StreamExtractor(table=True).feed_all(doc)
+        return extractor.rows if extractor.table_done or extractor.rows else None
+
+    def find_text(self, doc, match):
+        extractor = StreamExtractor(match=match).feed_all(doc)
+        return (extractor.found_text, extractor.found_path) if extractor.found_path else ("", None)
+
+    def text_at(self, doc, path):
+        return StreamExtractor(path=path).feed_all(doc).found_text
+
+
+# Порядок — від найшвидшого (python bench.py parse, 186 КБ: selectolax ~5 мс,
+# stream ~14, lxml 85–210 — bs4 будує дерево з Python-об'єктів і поверх lxml,
+# html.parser 220–340); значення — модулі, які мають бути встановлені
+PARSER_MODULES = {
+    "selectolax":  ("selectolax",),
+    "stream":      (),
+    "lxml":        ("lxml", "bs4"),
+    "html.parser": ("bs4",),
+}
+
+
+def parser_available(name: str) -> bool:
+    # find_spec не імпортує модуль — вибір бекенда не додає часу холодного старту
+    return name in PARSER_MODULES and all(importlib.util.find_spec(m) for m in PARSER_MODULES[name])
+
+
+def make_parser_backend(name: str):
+    if name == "selectolax":
+        return SelectolaxBackend()
+    if name == "stream":
+        return StreamBackend()
+    return Bs4Backend(name)
+
+
+def select_parser_backend(preferred: str = "auto"):
+    """HTML_PARSER=auto — найшвидший встановлений; інакше — указаний (якщо доступний)."""
+    if preferred != "auto":
+        if parser_available(preferred):
+            return make_parser_backend(preferred)
+        log.warning(f"Парсер «{preferred}» недоступний — обираємо автоматично")
+    for name in PARSER_MODULES:
+        if parser_available(name):
+            return make_parser_backend(name)
+
+
+PARSER = select_parser_backend(HTML_PARSER)
 
 
 # ── Джерело 1: ЄЛіки ─────────────────────────────────────────────────────────
 
-def fetch_eliky() -> list:
-    resp = requests.get(ELIKY_URL, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+def parse_eliky(html: str, scoped: bool = True, backend=None):
+    """
+    Записи з першої таблиці сторінки ЄЛіки або None, якщо таблиці немає.
+    scoped=True — будувати дерево лише з таблиці (для bs4-бекендів).
+    """
+    backend = backend or PARSER
+    rows = backend.table_rows(backend.parse(html, scoped=scoped))
+    return None if rows is None else eliky_records(rows)
+
+
+def eliky_records(rows: list) -> list:
+    """Записи ЄЛіки з рядків таблиці (перший — заголовок)."""
     records = []
-    table = soup.find("table")
-    if not table:
-        log.warning("ЄЛіки: таблицю не знайдено")
-        return records
-    for row in table.find_all("tr")[1:]:
-        cols = [c.get_text(strip=True) for c in row.find_all(["td", "th"])]
+    for cols in rows[1:]:
         if len(cols) >= 5:
             records.append({
                 "region":   cols[0],
@@ -112,35 +2172,190 @@ def fetch_eliky() -> list:
     return records
 
 
-def check_eliky(state: dict) -> None:
+def fetch_eliky(entry: dict):
+    """
+    (новий запис http_cache, записи таблиці ЄЛіки).
+    Якщо сторінка не змінилась з минулого запуску — (запис http_cache з новими валідаторами, None).
+    """
+    started = time.perf_counter()
+    # Бекенд stream розбирає таблицю ще під час завантаження; деревним досить знати, де вона скінчилась
+    watcher = StreamExtractor(table=True) if PARSER.name == "stream" else TableEndWatcher()
+    resp, body, text = fetch_page(ELIKY_URL, entry, watcher)
+    if body is None:
+        return refreshed_entry(entry, resp), None
+    if PARSER.name == "stream" and watcher.done:
+        # Таблицю вже розібрано під час завантаження — другий прохід не потрібен
+        records = eliky_records(watcher.rows)
+    else:
+        records = parse_eliky(text, scoped=PARSE_MODE == "scoped")
+    if records is None:
+        log.warning("ЄЛіки: таблицю не знайдено")
+        records = []
+    return page_entry(resp, body, started), records
+
+
+def check_eliky(state: dict, fetched: Future) -> None:
+    """Обробка результату fetch_eliky: диф з відомими ID і сповіщення."""
     log.info("── Перевірка ЄЛіки ──")
-    known = set(state["eliky_ids"])
+    known = seen_store(state, "eliky_ids")
+    hospitals = {tuple(h) for h in state["eliky_hospitals"]}
     try:
-        records = fetch_eliky()
+        entry, records = fetched.result()
     except Exception as e:
         log.error(f"ЄЛіки: помилка — {e}")
+        note_seen(known, "ЄЛіки")
         return
+    if records is None:
+        log.info("ЄЛіки: сторінка не змінилась — пропускаємо")
+        state["http_cache"][ELIKY_URL] = entry
+        note_seen(known, "ЄЛіки")
+        return
+    state["http_cache"][ELIKY_URL] = entry
     log.info(f"ЄЛіки: знайдено {len(records)} записів")
-    new_count = 0
-    for rec in records:
-        rid = make_id(rec["hospital"], rec["quantity"], rec["date"])
+    # Новий запис у лікарні, що була на попередній сторінці, — оновлення
+    # кількості; у лікарні, якої там не було (вперше або після того, як
+    # залишок закінчився і рядок зник), — новий залишок (вищий пріоритет).
+    # Лікарні відомих записів вважаються відомими (стан до появи eliky_hospitals).
+    ids = [record_id(known, rec["hospital"], rec["quantity"], rec["date"]) for rec in records]
+    hospitals |= {(rec["hospital"], rec["region"]) for rec, rid in zip(records, ids) if rid in known}
+    blocks = {PRIORITY_NEW: [], PRIORITY_QUANTITY: []}
+    held = 0
+    page_ids = set(ids)
+    for rec, rid in zip(records, ids):
         if rid not in known:
-            log.info(f"Новий ЄЛіки: {rec['hospital']} | {rec['quantity']} | {rec['date']}")
-            try:
-                send_telegram(
-                    "💊 <b>АБІРАТЕРОН — ЄЛіки (новий запис)</b>\n\n"
-                    f"🏥 <b>Лікарня:</b> {rec['hospital']}\n"
-                    f"📍 <b>Область:</b> {rec['region']}\n"
-                    f"💊 <b>Кількість:</b> {rec['quantity']}\n"
-                    f"📅 <b>Дата оновлення:</b> {rec['date']}\n\n"
-                    f"🔗 <a href='{ELIKY_URL}'>Переглянути на ЄЛіки</a>"
-                )
-            except Exception as e:
-                log.error(f"Telegram помилка: {e}")
-            known.add(rid)
-            new_count += 1
-    log.info(f"ЄЛіки: нових записів {new_count}")
-    state["eliky_ids"] = list(known)
+            where = (rec["hospital"], rec["region"])
+            priority = PRIORITY_QUANTITY if where in hospitals else PRIORITY_NEW
+            log.info(f"Новий ЄЛіки ({PRIORITY_NAMES[priority]}): {rec['hospital']} | {rec['quantity']} | {rec['date']}")
+            if priority == PRIORITY_QUANTITY and COALESCE_MINUTES > 0:
+                hold_change(state, rec)
+                held += 1
+            else:
+                blocks[priority].append(eliky_block(rec, priority))
+            known.touch([rid])
+            hospitals.add(where)
+    settle_pending(state, records)
+    log.info(
+        f"ЄЛіки: нових записів {sum(map(len, blocks.values())) + held} "
+        f"(нових лікарень {len(blocks[PRIORITY_NEW])}, оновлень кількості {len(blocks[PRIORITY_QUANTITY]) + held}"
+        + (f", з них у вікні згладжування {held})" if held else ")")
+    )
+    if LIVE_STATUS:
+        update_live_status(state, records, PRIORITY_NEW if blocks[PRIORITY_NEW] else PRIORITY_QUANTITY)
+    else:
+        for priority, group in blocks.items():
+            notify(state, group, priority)
+    remember_seen(known, "ЄЛіки", page_ids)
+    state["eliky_hospitals"] = [list(h) for h in sorted({(rec["hospital"], rec["region"]) for rec in records})]
+
+
+def eliky_block(rec: dict, priority: int, changes: int = 1):
+    """(шаблон, поля) для notify()."""
+    fields = {
+        "hospital": rec["hospital"], "region": rec["region"],
+        "quantity": rec["quantity"], "date": rec["date"], "url": ELIKY_URL,
+    }
+    if changes > 1:
+        return "eliky_coalesced", dict(fields, minutes=f"{COALESCE_MINUTES:g}", changes=changes)
+    return ("eliky_quantity" if priority == PRIORITY_QUANTITY else "eliky_new"), fields
+
+
+# ── Згладжування змін ЄЛіки ──────────────────────────────────────────────────
+# Рядок ЄЛіки може кілька разів за годину змінити кількість чи дату — кожен
+# варіант має новий make_id. Зміни в уже відомій лікарні тримаються в
+# state["eliky_pending"] по ключу (лікарня, форма): вікно відкриває перша зміна,
+# наступні лише оновлюють значення. Коли вікно минуло — одне повідомлення з
+# останнім значенням. Стан зберігається, тож працює і для cron-запусків.
+# Значення у вікні звіряється з кожною сторінкою (settle_pending): рядок міг
+# повернутись до вже відомого варіанта, ID якого не новий, або зникнути.
+
+def coalesce_key(rec: dict) -> str:
+    return f"{rec['hospital']}|{rec['form']}"
+
+
+def hold_change(state: dict, rec: dict) -> None:
+    key = coalesce_key(rec)
+    pending = state["eliky_pending"].setdefault(key, {
+        "first": int(time.time()), "changes": 0, "announced": state["eliky_rows"].get(key),
+    })
+    pending["record"] = rec
+    pending["changes"] += 1
+
+
+def settle_pending(state: dict, records: list) -> None:
+    """
+    Після розбору сторінки: у вікні — значення з її рядка; вікно закривається
+    без повідомлення, якщо рядок зник або повернувся до значення, яке бачили
+    до відкриття вікна (announced).
+    """
+    rows = {coalesce_key(rec): rec for rec in records}
+    for key, pending in list(state["eliky_pending"].items()):
+        rec = rows.get(key)
+        if rec is None or [rec["quantity"], rec["date"]] == pending.get("announced"):
+            log.info(f"ЄЛіки: {key} — {'рядок зник' if rec is None else 'значення повернулось'}, зміну не надсилаємо")
+            del state["eliky_pending"][key]
+        else:
+            pending["record"] = rec
+    state["eliky_rows"] = {key: [rec["quantity"], rec["date"]] for key, rec in rows.items()}
+
+
+def flush_coalesced(state: dict) -> None:
+    """Відправляє зміни, чиє вікно минуло. Викликається кожного запуску, навіть коли сторінка не змінилась."""
+    now = time.time()
+    due = [
+        key for key, pending in state["eliky_pending"].items()
+        if now - pending["first"] >= COALESCE_MINUTES * 60
+    ]
+    if not due:
+        return
+    blocks = [
+        eliky_block(state["eliky_pending"][key]["record"], PRIORITY_QUANTITY, state["eliky_pending"][key]["changes"])
+        for key in due
+    ]
+    for key in due:
+        del state["eliky_pending"][key]
+    log.info(f"ЄЛіки: вікно згладжування минуло для {len(due)} рядків")
+    if not LIVE_STATUS:
+        notify(state, blocks, PRIORITY_QUANTITY)
+
+
+def next_coalesce_due(state: dict):
+    """Через скільки секунд закінчиться найближче вікно згладжування (None — вікон немає)."""
+    if not state["eliky_pending"]:
+        return None
+    first = min(pending["first"] for pending in state["eliky_pending"].values())
+    return max(0.0, first + COALESCE_MINUTES * 60 - time.time())
+
+
+def render_live_status(records: list, lang: str = NOTIFY_LANG):
+    """(текст живого повідомлення, хеш таблиці). Хеш не залежить від часу оновлення."""
+    lines = [
+        render("live_row", lang, hospital=rec["hospital"], region=rec["region"],
+               quantity=rec["quantity"], date=rec["date"])
+        for rec in records
+    ] or [render("live_empty", lang)]
+    digest = hashlib.sha256("\n".join(lines).encode()).hexdigest()[:16]
+    head = render("live_head", lang)
+    tail = render("live_tail", lang, checked=f"{datetime.now(timezone.utc):%d.%m.%Y %H:%M}", url=ELIKY_URL)
+    body, shown = [], 0
+    for line in lines:
+        more = "\n" + render("live_more", lang, count=len(lines) - shown)
+        if tg_len(head + "\n".join(body + [line]) + more + tail) > TELEGRAM_MAX_CHARS:
+            body.append(more.strip())
+            break
+        body.append(line)
+        shown += 1
+    return head + "\n".join(body) + tail, digest
+
+
+def update_live_status(state: dict, records: list, priority: int) -> None:
+    rendered = {}
+    updated = 0
+    for recipient in RECIPIENTS:
+        if recipient["lang"] not in rendered:
+            rendered[recipient["lang"]] = render_live_status(records, recipient["lang"])
+        text, digest = rendered[recipient["lang"]]
+        updated += enqueue_live(state, text, digest, recipient["chat_id"], priority)
+    log.info(f"ЄЛіки: живе повідомлення — {'оновлюємо в ' + str(updated) + ' чатах' if updated else 'без змін'}")
 
 
 # ── Джерело 2: НІР (unci.org.ua) ─────────────────────────────────────────────
@@ -150,26 +2365,71 @@ def check_eliky(state: dict) -> None:
 ABIRATERONE_KEYWORDS = ["абіратерон", "abiraterone"]
 
 
-def fetch_unci():
-    resp = requests.get(UNCI_URL, headers=HEADERS, timeout=30)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+def is_update_date(text: str) -> bool:
+    return "оновлено" in text.lower() and len(text) < 80
 
-    update_date = ""
-    for tag in soup.find_all(string=True):
-        text = tag.strip()
-        if "оновлено" in text.lower() and len(text) < 80:
-            update_date = text
-            break
 
-    records = []
-    table = soup.find("table")
-    if not table:
-        log.warning("НІР: таблицю не знайдено")
-        return update_date, records
+def locate_update_date(backend, doc, locator: dict):
+    """
+    Шукає рядок «оновлено …» спершу за збереженим шляхом (locator), і лише
+    при промаху — повним проходом по всіх текстових вузлах сторінки.
+    Повертає (дата, оновлений locator) — locator не змінюється на місці.
+    """
+    locator = dict(locator or {})
+    locator.setdefault("hits", 0)
+    locator.setdefault("misses", 0)
+    if locator.get("backend") == backend.name and locator.get("path"):
+        text = backend.text_at(doc, locator["path"])
+        if text and is_update_date(text):
+            locator["hits"] += 1
+            locator["last"] = "hit"
+            return text, locator
+
+    update_date, path = backend.find_text(doc, is_update_date)
+    locator["misses"] += 1
+    locator["last"] = "miss"
+    if path is not None:
+        locator["backend"] = backend.name
+        locator["path"]    = path
+    return update_date, locator
+
 
-    for row in table.find_all("tr")[1:]:
-        cols = [c.get_text(strip=True) for c in row.find_all(["td", "th"])]
+def parse_unci(html: str, backend=None, locator: dict = None):
+    """
+    (дата оновлення, записи з Абіратероном, locator дати);
+    записи None — якщо таблиці немає.
+    """
+    backend = backend or PARSER
+    doc = backend.parse(html)
+
+    update_date, locator = locate_update_date(backend, doc, locator)
+
+    rows = backend.table_rows(doc)
+    if rows is None:
+        return update_date, None, locator
+    return update_date, unci_records(rows), locator
+
+
+def unci_from_watcher(watcher: StreamExtractor, locator: dict = None):
+    """
+    parse_unci() для бекенда stream, коли дату й таблицю вже знайшов watcher
+    під час завантаження. Влучання — дату знайдено за збереженим шляхом
+    (watcher з path=), промах — повним пошуком після нього.
+    """
+    locator = dict(locator or {})
+    locator.setdefault("hits", 0)
+    locator.setdefault("misses", 0)
+    hit = watcher.found_by == "path"
+    locator["hits" if hit else "misses"] += 1
+    locator["last"] = "hit" if hit else "miss"
+    locator["backend"], locator["path"] = "stream", watcher.found_path
+    return watcher.found_text, unci_records(watcher.rows), locator
+
+
+def unci_records(rows: list) -> list:
+    """Рядки таблиці НІР з Абіратероном (перший рядок — заголовок)."""
+    records = []
+    for cols in rows[1:]:
         if not cols:
             continue
         name_lc  = cols[0].lower()
@@ -187,8 +2447,33 @@ def fetch_unci():
                 "form":     c(7),
                 "batch":    c(8),
             })
+    return records
 
-    return update_date, records
+
+def fetch_unci(entry: dict, locator: dict):
+    """
+    (новий запис http_cache, дата оновлення, записи з Абіратероном, locator дати).
+    Якщо сторінка не змінилась з минулого запуску — (запис http_cache з новими валідаторами, "", None, None).
+    """
+    started = time.perf_counter()
+    # Дата оновлення може стояти і після таблиці — читаємо, доки не знайдемо обидва.
+    # Спершу дата шукається за збереженим шляхом, повний пошук — лише при промаху.
+    # Деревним бекендам watcher не потрібен: без розбору не видно, де дата, — читаємо все
+    watcher = None
+    if PARSER.name == "stream":
+        path = locator.get("path") if locator and locator.get("backend") == "stream" else None
+        watcher = StreamExtractor(table=True, match=is_update_date, path=path)
+    resp, body, text = fetch_page(UNCI_URL, entry, watcher)
+    if body is None:
+        return refreshed_entry(entry, resp), "", None, None
+    if watcher is not None and watcher.done:
+        update_date, records, locator = unci_from_watcher(watcher, locator)
+    else:
+        update_date, records, locator = parse_unci(text, locator=locator)
+    if records is None:
+        log.warning("НІР: таблицю не знайдено")
+        records = []
+    return page_entry(resp, body, started), update_date, records, locator
 
 
 def should_skip_unci(state: dict) -> bool:
@@ -211,20 +2496,30 @@ def should_skip_unci(state: dict) -> bool:
     return False
 
 
-def check_unci(state: dict) -> None:
+def check_unci(state: dict, fetched: Future) -> None:
+    """Обробка результату fetch_unci. should_skip_unci викликається раніше, у main()."""
     log.info("── Перевірка НІР ──")
 
-    if should_skip_unci(state):
-        return
-
-    known = set(state["unci_ids"])
+    known = seen_store(state, "unci_ids")
     last_update = state.get("unci_update_date", "")
 
     try:
-        update_date, records = fetch_unci()
+        entry, update_date, records, locator = fetched.result()
     except Exception as e:
         log.error(f"НІР: помилка — {e}")
+        note_seen(known, "НІР")
+        return
+    if records is None:
+        log.info("НІР: сторінка не змінилась — пропускаємо")
+        state["http_cache"][UNCI_URL] = entry
+        note_seen(known, "НІР")
         return
+    state["http_cache"][UNCI_URL] = entry
+    state["unci_date_locator"] = locator
+    log.info(
+        f"НІР: дата за збереженим шляхом — {'влучання' if locator['last'] == 'hit' else 'промах, повний пошук'} "
+        f"(усього влучань {locator['hits']}, промахів {locator['misses']})"
+    )
 
     log.info(f"НІР: дата оновлення — «{update_date}»")
 
@@ -237,61 +2532,138 @@ def check_unci(state: dict) -> None:
     if not records:
         log.info("НІР: Абіратерону на сторінці не знайдено")
         if update_date and update_date != last_update and last_update:
-            try:
-                send_telegram(
-                    "🏥 <b>НІР — сторінку оновлено</b>\n\n"
-                    f"🗓 <b>Нова дата:</b> {update_date}\n"
-                    "❌ Абіратерону у списку <b>не знайдено</b>\n\n"
-                    f"🔗 <a href='{UNCI_URL}'>Переглянути</a>"
-                )
-            except Exception as e:
-                log.error(f"Telegram помилка: {e}")
+            notify(state, [("unci_notice", {"update_date": update_date, "url": UNCI_URL})], PRIORITY_NOTICE)
+        remember_seen(known, "НІР", set())
         state["unci_update_date"] = update_date
         return
 
     log.info(f"НІР: знайдено {len(records)} записів з Абіратероном")
-    new_count = 0
+    blocks = []
+    page_ids = set()
     for rec in records:
-        rid = make_id(rec["name"], rec["quantity"], rec["expiry"], rec["batch"], update_date)
+        rid = record_id(known, rec["name"], rec["quantity"], rec["expiry"], rec["batch"], update_date)
+        page_ids.add(rid)
         if rid not in known:
             log.info(f"Новий НІР: {rec['name']} | {rec['quantity']} {rec['unit']} | партія {rec['batch']}")
-            try:
-                send_telegram(
-                    "🏥 <b>АБІРАТЕРОН — НІР (новий запис)</b>\n\n"
-                    f"💊 <b>Назва:</b> {rec['name']}\n"
-                    f"🧪 <b>Діюча речовина:</b> {rec['subst']}\n"
-                    f"📦 <b>Приміщення:</b> {rec['storage']}\n"
-                    f"🔢 <b>Кількість:</b> {rec['quantity']} {rec['unit']}\n"
-                    f"📅 <b>Термін придатності:</b> {rec['expiry']}\n"
-                    f"💉 <b>Форма випуску:</b> {rec['form']}\n"
-                    f"🔖 <b>Партія:</b> {rec['batch']}\n"
-                    f"🗓 <b>Дата оновлення НІР:</b> {update_date}\n\n"
-                    f"🔗 <a href='{UNCI_URL}'>Переглянути на сайті НІР</a>"
-                )
-            except Exception as e:
-                log.error(f"Telegram помилка: {e}")
-            known.add(rid)
-            new_count += 1
+            blocks.append(("unci_record", {
+                "name": rec["name"], "subst": rec["subst"], "storage": rec["storage"],
+                "quantity": rec["quantity"], "unit": rec["unit"], "expiry": rec["expiry"],
+                "form": rec["form"], "batch": rec["batch"], "update_date": update_date, "url": UNCI_URL,
+            }))
+            known.touch([rid])
 
-    log.info(f"НІР: нових записів {new_count}")
-    state["unci_ids"] = list(known)
+    log.info(f"НІР: нових записів {len(blocks)}")
+    notify(state, blocks, PRIORITY_URGENT)
+    remember_seen(known, "НІР", page_ids)
     state["unci_update_date"] = update_date
 
 
 # ── Main ──────────────────────────────────────────────────────────────────────
 
+def begin_run() -> None:
+    """Скидає лічильники й дедлайн запуску — для кожної ітерації LOOP_INTERVAL."""
+    global _run_started, _dispatcher
+    _run_started = time.monotonic()
+    _dispatcher = None
+    _retry_stats.clear()
+    _seen_stats.clear()
+    _cache_stats.update(not_modified=0, same_hash=0, bytes_saved=0, ms_saved=0.0)
+
+
 def main():
-    log.info(f"════ Моніторинг Абіратерону | CHECK_SOURCE={CHECK_SOURCE} ════")
+    if LOOP_INTERVAL <= 0:
+        run(load_state())
+        return
+    # Постійний процес: стан у пам'яті (і зберігається після кожної перевірки),
+    # HTTP-з'єднання живуть між перевірками
     state = load_state()
+    while True:
+        begin_run()
+        run(state)
+        due = next_coalesce_due(state)
+        pause = LOOP_INTERVAL if due is None else min(LOOP_INTERVAL, due + 1)
+        log.info(f"Наступна перевірка через {pause:.0f} с")
+        time.sleep(pause)
 
-    if CHECK_SOURCE in ("eliky", "all"):
-        check_eliky(state)
 
-    if CHECK_SOURCE in ("unci", "all"):
-        check_unci(state)
+def run(state: dict) -> None:
+    log.info(f"════ Моніторинг Абіратерону | CHECK_SOURCE={CHECK_SOURCE} | парсер {PARSER.name} ════")
+    started = time.perf_counter()
+    upgrade_id_version(state)
+    flush_outbox(state)
+    flush_deferred(state)
+
+    want_eliky = CHECK_SOURCE in ("eliky", "all")
+    want_unci  = CHECK_SOURCE in ("unci", "all") and not should_skip_unci(state)
+
+    # Сторінки завантажуються паралельно; стан і сповіщення обробляються по черзі
+    # в головному потоці, тож час запуску ≈ час найповільнішого джерела.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        eliky = pool.submit(
+            with_retries, "ЄЛіки", fetch_eliky, dict(state["http_cache"].get(ELIKY_URL, {}))
+        ) if want_eliky else None
+        unci  = pool.submit(
+            with_retries, "НІР", fetch_unci, dict(state["http_cache"].get(UNCI_URL, {})),
+            dict(state["unci_date_locator"])
+        ) if want_unci else None
+        if eliky:
+            check_eliky(state, eliky)
+        if want_eliky:
+            flush_coalesced(state)
+        apply_deliveries(state)
+        if unci:
+            check_unci(state, unci)
+
+    left = finish_deliveries(state)
+    if left:
+        log.warning(f"Outbox: {left} повідомлень не доставлено — повторимо на наступному запуску")
 
     save_state(state)
-    log.info("════ Готово. Стан збережено. ════")
+    log_run_summary(state)
+    log.info(f"════ Готово за {time.perf_counter() - started:.1f} с. Стан збережено. ════")
+
+
+def log_run_summary(state: dict) -> None:
+    """Підсумок запуску: повтори по джерелах, доставка по чатах, кеш, HTTP-з'єднання."""
+    for name, stats in _retry_stats.items():
+        log.info(f"Повтори: {name} — спроб {stats['attempts']}, результат «{stats['outcome']}»")
+    if _dispatcher is not None:
+        st = _dispatcher.stats
+        log.info(
+            f"Telegram: надіслано {st['sent']}, 429 — {st['rate_limited']}, "
+            f"повторів {st['retried']}, помилок {st['failed']}"
+        )
+        cache = _render.cache_info()
+        if cache.hits or cache.misses:
+            log.info(f"Шаблони: відрендерено {cache.misses}, з кешу {cache.hits}")
+        if _dispatcher.sent_by_priority:
+            log.info("Telegram за класами: " + ", ".join(
+                f"{PRIORITY_NAMES.get(p, p)} — {n}" for p, n in sorted(_dispatcher.sent_by_priority.items())
+            ))
+        for chat_id, rs in state["recipients"].items():
+            if rs["failed_in_row"]:
+                log.warning(
+                    f"Telegram: чат {chat_id} — {rs['failed_in_row']} помилок поспіль, "
+                    f"остання: {rs['last_error']}"
+                )
+    for source, st in _seen_stats.items():
+        log.info(
+            f"Побачені ID: {source} — {st['size']} "
+            f"(забуто за {SEEN_TTL_DAYS:g} дн.: {st['ttl']}, понад ліміт {SEEN_MAX_IDS}: {st['cap']})"
+            + (f"; фільтр Блума відсіяв запитів до бази: {st['bloom_skips']}" if st["bloom_skips"] else "")
+            + (f"; перенесено зі старої версії хешу: {st['rekeyed']}" if st["rekeyed"] else "")
+        )
+    if _cache_stats["not_modified"] or _cache_stats["same_hash"]:
+        log.info(
+            f"Кеш: 304 для {_cache_stats['not_modified']} сторінок, "
+            f"той самий хеш для {_cache_stats['same_hash']}, зекономлено "
+            f"{_cache_stats['bytes_saved']} байт і {_cache_stats['ms_saved']:.0f} мс"
+        )
+    http = connection_stats()
+    log.info(
+        f"HTTP: запитів {http['requests']}, нових з'єднань {http['new']}, "
+        f"повторно використаних {http['reused']}"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# monitor.py читає секрети при імпорті — для тестів вони не потрібні
+os.environ.setdefault("TELEGRAM_TOKEN", "test")
+os.environ.setdefault("CHAT_ID", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import monitor  # noqa: E402
+
+
+@pytest.fixture
+def state_files(tmp_path, monkeypatch):
+    """state.json і state.journal у тимчасовій теці, журнал стану — з нуля."""
+    monkeypatch.setattr(monitor, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(monitor, "STATE_JOURNAL", str(tmp_path / "state.journal"))
+    monkeypatch.setattr(monitor, "STATE_BACKEND", "json")
+    monkeypatch.setattr(monitor, "STATE_COMPACT_EVERY", 48)
+    monkeypatch.setattr(monitor, "_journal", {"snapshot": None, "generation": None, "lines": 0, "broken": False})
+    return tmp_path
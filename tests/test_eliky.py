@@ -0,0 +1,102 @@
+import hashlib
+import json
+from concurrent.futures import Future
+
+import pytest
+
+import monitor
+
+
+def record(hospital, quantity):
+    return {
+        "hospital": hospital, "region": "Київська", "form": "таблетки 250 мг",
+        "quantity": quantity, "date": "01.03.2026",
+    }
+
+
+def check(state, records, monkeypatch, coalesce=0):
+    """check_eliky на готовій сторінці; повертає {пріоритет: [лікарня, ...]}."""
+    sent = {}
+    monkeypatch.setattr(monitor, "LIVE_STATUS", False)
+    monkeypatch.setattr(monitor, "COALESCE_MINUTES", coalesce)
+    monkeypatch.setattr(
+        monitor, "notify",
+        lambda state, blocks, priority: sent.setdefault(priority, []).extend(f["hospital"] for _, f in blocks),
+    )
+    fetched = Future()
+    fetched.set_result(({}, records))
+    monitor.check_eliky(state, fetched)
+    return sent
+
+
+def test_new_hospital_against_previous_page(state_files, monkeypatch):
+    state = monitor.load_state()
+    check(state, [record("A", "10"), record("B", "5")], monkeypatch)
+    # B зникла зі сторінки (залишок закінчився)
+    sent = check(state, [record("A", "20")], monkeypatch)
+    assert sent.get(monitor.PRIORITY_QUANTITY) == ["A"]
+    assert state["eliky_hospitals"] == [["A", "Київська"]]
+    # B повернулась — це знову новий залишок, а не оновлення кількості
+    sent = check(state, [record("A", "20"), record("B", "7")], monkeypatch)
+    assert sent.get(monitor.PRIORITY_NEW) == ["B"]
+    assert not sent.get(monitor.PRIORITY_QUANTITY)
+
+
+def test_seen_size_reported_when_page_skipped(state_files, monkeypatch):
+    state = monitor.load_state()
+    check(state, [record("A", "10"), record("B", "5")], monkeypatch)
+    monitor._seen_stats.clear()
+    check(state, None, monkeypatch)  # 304 / той самий хеш
+    assert monitor._seen_stats["ЄЛіки"]["size"] == 2
+
+
+def test_coalesce_flap_back(state_files, monkeypatch):
+    state = monitor.load_state()
+    check(state, [record("A", "5"), record("B", "1")], monkeypatch, coalesce=60)
+    sent = check(state, [record("A", "4"), record("B", "2")], monkeypatch, coalesce=60)
+    assert not sent.get(monitor.PRIORITY_QUANTITY)
+    assert set(state["eliky_pending"]) == {"A|таблетки 250 мг", "B|таблетки 250 мг"}
+    # A повернулась до 5 — вже відомий ID; B зникла зі сторінки
+    check(state, [record("A", "5")], monkeypatch, coalesce=60)
+    assert state["eliky_pending"] == {}
+
+
+def test_coalesce_sends_value_on_page(state_files, monkeypatch):
+    state = monitor.load_state()
+    check(state, [record("A", "5")], monkeypatch, coalesce=60)
+    check(state, [record("A", "4")], monkeypatch, coalesce=60)
+    check(state, [record("A", "3")], monkeypatch, coalesce=60)
+    check(state, [record("A", "4")], monkeypatch, coalesce=60)  # відомий ID, але не те, що бачили до вікна
+    (pending,) = state["eliky_pending"].values()
+    assert pending["record"]["quantity"] == "4" and pending["changes"] == 2
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+@pytest.mark.parametrize("version", ["blake2b", "xxh3"])
+def test_legacy_md5_state_not_renotified(state_files, monkeypatch, backend, version):
+    if not monitor.fingerprint_available(version):
+        pytest.skip(f"{version} недоступний")
+    monkeypatch.setattr(monitor, "ID_VERSION", version)
+    monkeypatch.setattr(monitor, "_make_id", monitor.FINGERPRINTS[version])
+    monkeypatch.setattr(monitor, "STATE_DB", str(state_files / "state.db"))
+    monkeypatch.setattr(monitor, "STATE_BACKEND", backend)
+    page = [record("A", "10"), record("B", "5")]
+    # state.json першої версії монітора: повні md5 списком, без id_version
+    legacy = [hashlib.md5("|".join([r["hospital"], r["quantity"], r["date"]]).encode()).hexdigest() for r in page]
+    with open(monitor.STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"eliky_ids": legacy, "unci_ids": [], "unci_update_date": ""}, f)
+
+    state = monitor.load_state()
+    monitor.upgrade_id_version(state)
+    assert state["id_version"] == version and state["id_legacy"] == ["md5"]
+    sent = check(state, page, monkeypatch)
+    assert not any(sent.values())
+    known = monitor.seen_store(state, "eliky_ids")
+    assert known.rekeyed == 0  # уже перенесено
+    assert all(monitor.make_id(r["hospital"], r["quantity"], r["date"]) in known for r in page)
+    assert len(known) == 2
+    # новий запис після переходу — як і раніше, сповіщення
+    sent = check(state, page + [record("B", "6")], monkeypatch)
+    assert {p: v for p, v in sent.items() if v} == {monitor.PRIORITY_QUANTITY: ["B"]}
+    if backend == "sqlite":
+        monitor._db.close()
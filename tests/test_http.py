@@ -0,0 +1,51 @@
+import monitor
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, status: int = 200, headers: dict = None):
+        self.body, self.status_code, self.headers = body, status, headers or {}
+        self.encoding, self.url = "utf-8", "https://example.test/"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses, self.requests = list(responses), []
+
+    def get(self, url, headers, **kwargs):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+def test_same_hash_keeps_new_validators(monkeypatch):
+    body = "<table><tr><td>1</td></tr></table>".encode()
+    session = FakeSession(
+        FakeResponse(body, headers={"ETag": '"a"'}),
+        FakeResponse(body, headers={"ETag": '"b"'}),  # ETag змінився, вміст — ні
+        FakeResponse(b"", status=304),
+    )
+    monkeypatch.setattr(monitor, "get_session", lambda: session)
+    monkeypatch.setattr(monitor, "FORCE_PARSE", False)
+
+    resp, body_read, _ = monitor.fetch_page("https://example.test/", {})
+    entry = monitor.page_entry(resp, body_read, 0)
+    resp, body_read, text = monitor.fetch_page("https://example.test/", entry)
+    assert body_read is None and text is None
+    entry = monitor.refreshed_entry(entry, resp)
+    assert entry["etag"] == '"b"' and entry["sha256"] == monitor.body_hash(body)
+
+    resp, body_read, _ = monitor.fetch_page("https://example.test/", entry)
+    assert session.requests[-1]["If-None-Match"] == '"b"'
+    assert body_read is None and monitor.refreshed_entry(entry, resp) == entry
@@ -0,0 +1,43 @@
+import monitor
+
+
+def fields(**override):
+    base = {
+        "hospital": "КНП «Онкоцентр»", "region": "Київська", "quantity": "5уп.",
+        "date": "01.03.2026", "url": monitor.ELIKY_URL,
+    }
+    return dict(base, **override)
+
+
+def test_tg_len_counts_utf16():
+    assert monitor.tg_len("абв") == 3
+    assert monitor.tg_len("💊") == 2  # поза BMP — дві UTF-16 одиниці
+
+
+def test_pack_digest_limit_in_utf16():
+    sep = monitor.DIGEST_SEPARATOR
+    blocks = ["💊" * 3, "💊" * 3, "ab"]
+    limit = monitor.tg_len(blocks[0]) * 2 + len(sep) - 1  # за len() два блоки влізли б разом, за UTF-16 — ні
+    messages = monitor.pack_digest(blocks, limit=limit)
+    assert messages == ["💊" * 3, "💊" * 3 + sep + "ab"]
+    assert all(monitor.tg_len(m) <= limit for m in messages)
+
+
+def test_pack_digest_keeps_blocks_and_order():
+    blocks = [f"блок {i} " + "я" * (i * 37 % 300) for i in range(200)]
+    messages = monitor.pack_digest(blocks, limit=1000)
+    assert all(monitor.tg_len(m) <= 1000 for m in messages)
+    assert monitor.DIGEST_SEPARATOR.join(messages).split(monitor.DIGEST_SEPARATOR) == blocks
+    assert monitor.pack_digest(["x" * 1500], limit=1000) == ["x" * 1500]  # завеликий блок — окремо, як є
+
+
+def test_render_block_fits():
+    short = fields()
+    assert monitor.render_block("eliky_new", "uk", short) == monitor.render("eliky_new", "uk", **short)
+
+    long = fields(hospital="💊<&>" * 2000)  # емодзі — 2 одиниці, < & > — довші після екранування
+    text = monitor.render_block("eliky_new", "uk", long)
+    assert monitor.TELEGRAM_MAX_CHARS - 6 <= monitor.tg_len(text) <= monitor.TELEGRAM_MAX_CHARS
+    assert "…" in text and monitor.ELIKY_URL in text
+    # обрізане значення, а не HTML: жодної розірваної сутності
+    assert "&am…" not in text and "&l…" not in text and "&g…" not in text
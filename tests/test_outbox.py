@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import monitor
+
+
+class FakeTelegram:
+    """Замість Bot API: записує виклики; текст з self.fail отримує відповідь (статус, опис)."""
+
+    def __init__(self):
+        self.calls, self.fail = [], {}
+        self._lock = threading.Lock()
+        self._ids = iter(range(100, 1000))
+
+    def __call__(self, method, payload):
+        time.sleep(0.02)  # щоб відправки різних потоків перетинались
+        with self._lock:
+            self.calls.append((method, payload))
+            if payload.get("text") in self.fail:
+                status, description = self.fail[payload["text"]]
+                response = requests.Response()
+                response.status_code = status
+                raise requests.HTTPError(f"{status} {description}", response=response)
+            return {"message_id": payload.get("message_id") or next(self._ids)}
+
+
+@pytest.fixture
+def telegram(state_files, monkeypatch):
+    """Свіжий Dispatcher і підмінений Telegram API."""
+    api = FakeTelegram()
+    monkeypatch.setattr(monitor, "telegram_api", api)
+    monkeypatch.setattr(monitor, "TG_CHAT_BURST", 100)
+    monkeypatch.setattr(monitor, "_dispatcher", None)
+    yield api
+    if monitor._dispatcher is not None:
+        monitor._dispatcher.stop()
+
+
+def live_item(text, digest, message_id=None):
+    return {
+        "key": monitor.message_key("1", text), "kind": "live", "chat_id": "1", "text": text,
+        "priority": monitor.PRIORITY_QUANTITY, "hash": digest, "message_id": message_id,
+        "runs": 1, "created": int(time.time()),
+    }
+
+
+@pytest.mark.parametrize("message_id", [None, 7])
+def test_live_replaced_after_flush(telegram, message_id):
+    state = monitor.load_state()
+    state["outbox"].append(live_item("стара таблиця", "old", message_id))
+    if message_id:
+        state["live_status"]["1"] = {"message_id": message_id, "hash": "older"}
+    monitor.flush_outbox(state)
+    monitor.enqueue_live(state, "нова таблиця", "new", "1")
+    assert monitor.finish_deliveries(state) == 0
+    methods = [m for m, _ in telegram.calls]
+    assert methods.count("sendMessage") == (0 if message_id else 1)
+    assert methods.count("pinChatMessage") == methods.count("sendMessage")
+    assert [p["text"] for m, p in telegram.calls if m in ("sendMessage", "editMessageText")][-1] == "нова таблиця"
+    assert state["live_status"]["1"]["hash"] == "new"
+
+
+def test_enqueue_dedup_and_delivery(telegram):
+    state = monitor.load_state()
+    assert monitor.enqueue(state, "перше", "1")
+    assert not monitor.enqueue(state, "перше", "1")  # уже в outbox
+    assert monitor.enqueue(state, "перше", "2")  # інший чат — інший ключ
+    assert monitor.finish_deliveries(state) == 0
+    assert state["outbox"] == []
+    assert set(state["delivered"]) == {monitor.message_key("1", "перше"), monitor.message_key("2", "перше")}
+    assert not monitor.enqueue(state, "перше", "1")  # уже доставлене
+    assert len(telegram.calls) == 2
+
+
+def test_rejected_message_dropped(telegram):
+    state = monitor.load_state()
+    telegram.fail["x" * 5000] = (400, "Bad Request: message is too long")
+    telegram.fail["недоступний"] = (403, "Forbidden: bot was blocked by the user")
+    monitor.enqueue(state, "x" * 5000, "1")
+    monitor.enqueue(state, "наступне", "1")
+    monitor.enqueue(state, "недоступний", "2")
+    assert monitor.finish_deliveries(state) == 1
+    # відхилене — прибрано, не доставлене (чат недоступний) — лишається на наступний запуск
+    assert [item["text"] for item in state["outbox"]] == ["недоступний"]
+    assert list(state["delivered"]) == [monitor.message_key("1", "наступне")]
+    assert state["recipients"]["1"]["failed"] == 1 and state["recipients"]["1"]["delivered"] == 1
@@ -0,0 +1,174 @@
+import os
+import re
+
+import pytest
+
+import monitor
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Два еталони. baseline_rows — bs4 get_text на html.parser, як розбирались
+# сторінки до появи інших бекендів: з його записів пораховані ID у стані, тож
+# на добре сформованій розмітці будь-яка розбіжність повторила б сповіщення.
+# На рядках без </td> чи </tr> він вкладав клітинки одна в одну; там бекенди
+# звіряються між собою (з stream, він без залежностей) і з очікуваними
+# значеннями, а такі рядки після оновлення один раз отримали нові ID (README).
+BACKENDS = [
+    pytest.param(name, marks=pytest.mark.skipif(not monitor.parser_available(name), reason=f"{name} не встановлено"))
+    for name in monitor.PARSER_MODULES
+]
+
+
+def page(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def reference():
+    return monitor.make_parser_backend("stream")
+
+
+def baseline_rows(html):
+    bs4 = pytest.importorskip("bs4")
+    table = bs4.BeautifulSoup(html, "html.parser").find("table")
+    return [[c.get_text(strip=True) for c in row.find_all(["td", "th"])] for row in table.find_all("tr")]
+
+
+def well_formed(html):
+    """Рядки НІР без </td></tr> — з ними: «<tr><td>a<td>b» → «<tr><td>a</td><td>b</td></tr>»."""
+    lines = []
+    for line in html.splitlines():
+        if line.lstrip().startswith("<tr><td>") and not line.endswith("</tr>"):
+            line = re.sub(r"(?<!</td>)(?<!<tr>)<td>", "</td><td>", line) + "</td></tr>"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("scoped", [True, False])
+@pytest.mark.parametrize("name", BACKENDS)
+def test_eliky_fixture(name, scoped):
+    html = page("eliky.html")
+    records = monitor.parse_eliky(html, scoped=scoped, backend=monitor.make_parser_backend(name))
+    assert records == monitor.parse_eliky(html, scoped=False, backend=reference())
+    assert len(records) == 48
+    # рядок без </td> і рядок з посиланням, <br> і коментарем у клітинках
+    assert records[5] == {
+        "region": "Житомирська", "form": "Абіратерон, таблетки 250 мг №120",
+        "hospital": "Онкодиспансер ім. О. О. Шалімова, відділення 5", "quantity": "136уп.", "date": "10.07.2026",
+    }
+    assert records[3]["hospital"] == "КНП «Обласний клінічний онкологічний центр»відділення 3"
+    assert records[3]["quantity"] == "579уп."
+
+
+def test_eliky_fixture_vs_baseline():
+    """Від розбору до появи бекендів відрізняються лише рядки без </td> — їх буде повідомлено ще раз."""
+    html = page("eliky.html")
+    rows = reference().table_rows(html)
+    changed = [i for i, (old, new) in enumerate(zip(baseline_rows(html), rows)) if old != new]
+    assert changed == [6, 17, 28, 39]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_well_formed_matches_baseline(name):
+    html = well_formed(page("unci.html"))
+    assert "<td>B-00004</td></tr>" in html
+    backend = monitor.make_parser_backend(name)
+    assert backend.table_rows(backend.parse(html)) == baseline_rows(html)
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_unci_fixture(name):
+    html = page("unci.html")
+    backend = monitor.make_parser_backend(name)
+    update_date, records, locator = monitor.parse_unci(html, backend=backend)
+    assert (update_date, records) == monitor.parse_unci(html, backend=reference())[:2]
+    assert update_date == "Інформацію оновлено 13.03.2026"
+    assert [r["batch"] for r in records] == ["B-00009", "B-00031", "B-00047"]
+    # повторний розбір — за збереженим шляхом до дати
+    assert monitor.parse_unci(html, backend=backend, locator=locator)[0] == update_date
+
+
+@pytest.mark.parametrize("html, rows, closed", [
+    ("<table><tr><th>a<th>b<tr><td>r<td>f<td>h</tr></table>",
+     [["a", "b"], ["r", "f", "h"]], False),
+    ("<table><tr><td>r<td>f<tr><td>x<td>y</table>",
+     [["r", "f"], ["x", "y"]], False),
+    ("<table><tr><td>r</td><td>h<table><tr><td>in1</td><td>in2</td></tr></table></td><td>q</td></tr>"
+     "<tr><td>2</td></tr></table>",
+     [["r", "hin1in2", "in1", "in2", "q"], ["in1", "in2"], ["2"]], True),
+    ("<table><tr><td>r<td>h<table><tr><td>in1<td>in2</table><td>q<tr><td>2</table>",
+     [["r", "hin1in2", "in1", "in2", "q"], ["in1", "in2"], ["2"]], False),
+    ("<table><tr><td><p>a<p>b</td><td> c <br> d <!-- x --></td></tr></table>",
+     [["ab", "cd"]], True),
+], ids=["implicit-td", "implicit-tr", "nested-table", "nested-implicit", "inline-markup"])
+@pytest.mark.parametrize("name", BACKENDS)
+def test_table_markup(name, html, rows, closed):
+    backend = monitor.make_parser_backend(name)
+    assert backend.table_rows(backend.parse(html)) == rows
+    if closed:  # усі </td> і </tr> на місці — так само, як до появи бекендів
+        assert rows == baseline_rows(html)
+
+
+def stream_fetch(html, watcher, chunk):
+    """Як read_body: частинами, доки watcher не знайде все потрібне."""
+    for i in range(0, len(html), chunk):
+        watcher.feed(html[i:i + chunk])
+        if watcher.done:
+            break
+    return watcher
+
+
+@pytest.mark.parametrize("chunk", [512, 16384])
+def test_stream_watcher_matches_parse(chunk):
+    """Що watcher знайшов під час завантаження, те й дав би повний розбір бекендом stream."""
+    stream = monitor.make_parser_backend("stream")
+    html = page("eliky.html")
+    watcher = stream_fetch(html, monitor.StreamExtractor(table=True), chunk)
+    assert watcher.done
+    assert monitor.eliky_records(watcher.rows) == monitor.parse_eliky(html, backend=stream)
+
+    html = page("unci.html")
+    watcher = stream_fetch(html, monitor.StreamExtractor(table=True, match=monitor.is_update_date), chunk)
+    expected = monitor.parse_unci(html, backend=stream)
+    assert monitor.unci_from_watcher(watcher)[:2] == expected[:2]
+    assert monitor.unci_from_watcher(watcher)[2]["last"] == "miss"
+
+    # наступний запуск шукає дату за збереженим шляхом — влучання без повного пошуку
+    locator = expected[2]
+    watcher = stream_fetch(html, monitor.StreamExtractor(table=True, match=monitor.is_update_date,
+                                                         path=locator["path"]), chunk)
+    assert watcher.found_by == "path"
+    date, records, locator = monitor.unci_from_watcher(watcher, locator)
+    assert (date, records) == expected[:2] and locator["last"] == "hit"
+
+    # шлях застарів (вузол за ним — не дата) — промах, дату знаходить повний пошук
+    wrong = monitor.StreamExtractor(match=bool).feed_all(html).found_path  # перший непорожній текст
+    watcher = stream_fetch(html, monitor.StreamExtractor(table=True, match=monitor.is_update_date, path=wrong), chunk)
+    assert watcher.found_by == "match"
+    date, _, locator = monitor.unci_from_watcher(watcher, locator)
+    assert date == expected[0] and locator["last"] == "miss"
+    # вузла за шляхом немає зовсім — так само
+    watcher = stream_fetch(html, monitor.StreamExtractor(table=True, match=monitor.is_update_date,
+                                                         path=wrong[:-1] + [99]), chunk)
+    assert watcher.found_by == "match" and watcher.found_text == expected[0]
+
+
+def fed(html, watcher, chunk):
+    """Скільки символів прочитає read_body, поки watcher не скаже done."""
+    for i in range(0, len(html), chunk):
+        watcher.feed(html[i:i + chunk])
+        if watcher.done:
+            return i + chunk
+    return len(html)
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 512, 16384])
+@pytest.mark.parametrize("fixture", ["eliky.html", "unci.html"])
+def test_table_end_watcher(fixture, chunk):
+    """Деревні бекенди читають сторінку до того ж місця, що й watcher бекенда stream."""
+    html = page(fixture)
+    end = fed(html, monitor.TableEndWatcher(), chunk)
+    # на «</table» без «>» — на частину раніше, ніж stream
+    assert 0 <= fed(html, monitor.StreamExtractor(table=True), chunk) - end <= chunk
+    backend = reference()
+    assert backend.table_rows(backend.parse(html[:end])) == backend.table_rows(backend.parse(html))
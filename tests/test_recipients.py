@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import monitor
+
+
+def test_parse_recipients():
+    first, second = monitor.parse_recipients("1:lang=EN:quiet=23-07, 2")
+    assert first == {"chat_id": "1", "lang": "en", "quiet": (23, 7)}
+    assert second == {"chat_id": "2", "lang": monitor.NOTIFY_LANG, "quiet": None}
+
+
+def test_quiet_until_midnight():
+    (recipient,) = monitor.parse_recipients("1:quiet=0-24")
+    assert recipient["quiet"] == (0, 24)
+    assert all(monitor.in_quiet_hours(recipient, datetime(2026, 3, 1, hour)) for hour in range(24))
+    (recipient,) = monitor.parse_recipients("1:quiet=22-24")
+    assert [h for h in range(24) if monitor.in_quiet_hours(recipient, datetime(2026, 3, 1, h))] == [22, 23]
+    (recipient,) = monitor.parse_recipients("1:quiet=24-07")
+    assert recipient["quiet"] == (0, 7)
+
+
+def test_bad_options_are_skipped(caplog):
+    for spec in ("1:quiet=23", "1:quiet=a-b", "1:quiet=23-07-01", "1:quiet=", "1:colour=red"):
+        caplog.clear()
+        (recipient,) = monitor.parse_recipients(spec)
+        assert recipient == {"chat_id": "1", "lang": monitor.NOTIFY_LANG, "quiet": None}
+        assert "пропущено" in caplog.text
+
+
+def test_live_message_silent_in_quiet_hours(monkeypatch):
+    calls = []
+
+    def api(method, payload):
+        calls.append((method, payload))
+        return {"message_id": 7}
+
+    monkeypatch.setattr(monitor, "telegram_api", api)
+    monkeypatch.setattr(monitor, "RECIPIENTS", [{"chat_id": "1", "lang": "uk", "quiet": (23, 7)}])
+    monkeypatch.setattr(monitor, "in_quiet_hours", lambda recipient, now=None: True)
+    monitor.upsert_live_message({"chat_id": "1", "text": "стан", "message_id": None})
+    method, payload = calls[0]
+    assert method == "sendMessage" and payload["disable_notification"] is True
+
+    calls.clear()
+    monkeypatch.setattr(monitor, "in_quiet_hours", lambda recipient, now=None: False)
+    monitor.upsert_live_message({"chat_id": "1", "text": "стан", "message_id": None})
+    assert "disable_notification" not in calls[0][1]
@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+import monitor
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status}", response=response)
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    """Без справжніх пауз; повертає список затримок, які with_retries просив."""
+    slept = []
+    monkeypatch.setattr(monitor.time, "sleep", slept.append)
+    monkeypatch.setattr(monitor, "RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(monitor, "RETRY_BASE_DELAY", 2)
+    monkeypatch.setattr(monitor, "RETRY_MAX_DELAY", 30)
+    monkeypatch.setattr(monitor, "time_left", lambda: 1000)
+    monkeypatch.setattr(monitor, "_retry_stats", {})
+    return slept
+
+
+def flaky(*errors, result="ok"):
+    """Функція, що спершу кидає errors по одній, а потім повертає result."""
+    pending = list(errors)
+    calls = []
+
+    def fn(*args):
+        calls.append(args)
+        if pending:
+            raise pending.pop(0)
+        return result
+    fn.calls = calls
+    return fn
+
+
+@pytest.mark.parametrize("error", [
+    requests.ConnectionError("reset"), requests.Timeout("slow"), http_error(502), http_error(429),
+])
+def test_retryable_then_ok(retries, error):
+    fn = flaky(error)
+    assert monitor.with_retries("src", fn, "a") == "ok"
+    assert fn.calls == [("a",), ("a",)] and len(retries) == 1
+    assert monitor._retry_stats["src"]["attempts"] == 2 and monitor._retry_stats["src"]["outcome"] == "ok"
+
+
+@pytest.mark.parametrize("error", [http_error(404), http_error(403), ValueError("завелика відповідь")])
+def test_fatal_not_retried(retries, error):
+    fn = flaky(error)
+    with pytest.raises(type(error)):
+        monitor.with_retries("src", fn)
+    assert len(fn.calls) == 1 and retries == []
+    assert monitor._retry_stats["src"]["outcome"] == "помилка"
+
+
+def test_gives_up_after_attempts(retries):
+    fn = flaky(*[requests.ConnectionError("reset")] * 5)
+    with pytest.raises(requests.ConnectionError):
+        monitor.with_retries("src", fn)
+    assert len(fn.calls) == 3 and len(retries) == 2
+    assert all(0 <= d <= min(30, 2 * 2 ** i) for i, d in enumerate(retries))  # full jitter
+    assert monitor._retry_stats["src"]["outcome"] == "помилка"
+
+
+def test_retry_after_respected(retries):
+    fn = flaky(http_error(503, {"Retry-After": "7"}))
+    monitor.with_retries("src", fn)
+    assert retries[0] >= 7
+
+
+def test_deadline(retries, monkeypatch):
+    # наступна спроба не встигла б до RUN_DEADLINE — не чекаємо
+    monkeypatch.setattr(monitor, "time_left", lambda: 5)
+    fn = flaky(http_error(503, {"Retry-After": "10"}))
+    with pytest.raises(requests.HTTPError):
+        monitor.with_retries("src", fn)
+    assert len(fn.calls) == 1 and retries == []
+    assert monitor._retry_stats["src"]["outcome"] == "дедлайн"
+
+    fn = flaky(monitor.DeadlineExceeded("час вичерпано"))
+    with pytest.raises(monitor.DeadlineExceeded):
+        monitor.with_retries("other", fn)
+    assert len(fn.calls) == 1 and monitor._retry_stats["other"]["outcome"] == "дедлайн"
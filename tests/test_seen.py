@@ -0,0 +1,81 @@
+import hashlib
+import json
+import sqlite3
+
+import monitor
+
+
+def sqlite_store(state, source="eliky_ids"):
+    db = sqlite3.connect(":memory:")
+    db.executescript(monitor.DB_SCHEMA)
+    return monitor.SqliteSeenStore(db, source, state, max_ids=1000)
+
+
+def ids(n, salt="seen"):
+    return [hashlib.blake2b(f"{salt}{i}".encode(), digest_size=monitor.ID_BYTES).hexdigest() for i in range(n)]
+
+
+def test_pack_seen_roundtrip():
+    width = monitor.ID_BYTES * 2
+    seen = {rid: [1_700_000_000 + i, 1_800_000_000 - i] for i, rid in enumerate(ids(300))}
+    seen["0" * width] = [0, 0]
+    seen["0" * (width - 1) + "1"] = [1, 2]  # ведучі нулі не губляться
+    seen["f" * width] = [2**32 - 1, 2**32 - 1]  # межі uint64 / uint32
+    packed = json.loads(json.dumps(monitor.pack_seen(seen)))
+    assert packed["format"] == "packed"
+    assert monitor.unpack_seen(packed) == seen
+    assert monitor.unpack_seen(monitor.pack_seen({})) == {}
+
+
+def test_bloom_roundtrip():
+    added, other = ids(1000), ids(5000, salt="other")
+    bloom = monitor.BloomFilter(1000)
+    for rid in added:
+        bloom.add(rid)
+    loaded = monitor.BloomFilter.loads(json.loads(json.dumps(bloom.dumps())))
+    assert (loaded.capacity, loaded.size, loaded.k, loaded.bits) == (bloom.capacity, bloom.size, bloom.k, bloom.bits)
+    assert all(rid in loaded for rid in added)  # хибних «ні» не буває
+    false_positive = sum(rid in loaded for rid in other) / len(other)
+    assert false_positive < 0.03  # error_rate=0.01 із запасом
+
+
+def test_bloom_written_once_per_check(monkeypatch):
+    dumps = []
+    real = monitor.BloomFilter.dumps
+    monkeypatch.setattr(monitor.BloomFilter, "dumps", lambda self: dumps.append(1) or real(self))
+    state = {"id_legacy": []}
+    store = sqlite_store(state)
+    store.touch([f"{i:016x}" for i in range(500)])
+    store.rekey(f"{0:016x}", "f" * 16)
+    assert not dumps and "eliky_ids_bloom" not in state
+    monitor.remember_seen(store, "ЄЛіки", set())
+    assert len(dumps) == 1
+    # з фільтра зі стану — ті самі відповіді, без запитів до бази
+    again = sqlite_store(state)
+    again.db = store.db
+    assert "f" * 16 in again.bloom and f"{7:016x}" in again.bloom
+    monitor.note_seen(again, "ЄЛіки")
+    assert len(dumps) == 1  # нічого не змінилось — не переписуємо
+
+
+def test_db_migration_runs_once(state_files, monkeypatch):
+    monkeypatch.setattr(monitor, "STATE_DB", str(state_files / "state.db"))
+    monkeypatch.setattr(monitor, "STATE_BACKEND", "sqlite")
+    full = "0123456789abcdef0123456789abcdef"  # повний md5 зі старої версії
+    db = sqlite3.connect(monitor.STATE_DB)
+    db.executescript(monitor.DB_SCHEMA)
+    db.execute("INSERT INTO seen VALUES ('eliky_ids', ?, 1, 1)", (full,))
+    db.commit()
+    db.close()
+
+    state = monitor.load_state()
+    assert "schema_version" not in state
+    rows = monitor._db.execute("SELECT id FROM seen").fetchall()
+    assert rows == [(full[:monitor.ID_BYTES * 2],)]
+    # далі міграція не повторюється (і не сканує seen щоразу)
+    monitor._db.execute("INSERT INTO seen VALUES ('unci_ids', ?, 1, 1)", (full,))
+    monitor.save_state(state)
+    monitor._db.close()
+    monitor.load_state()
+    assert (full,) in monitor._db.execute("SELECT id FROM seen WHERE source = 'unci_ids'").fetchall()
+    monitor._db.close()
@@ -0,0 +1,100 @@
+import copy
+import json
+import os
+
+import monitor
+
+
+def journal_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_diff_roundtrip():
+    old = {"a": 1, "ids": {"x": [1, 2], "y": [3, 4]}, "outbox": [{"key": "k"}], "gone": True}
+    new = {"a": 2, "ids": {"x": [1, 5], "z": [6, 6]}, "outbox": [], "added": {"k": "v"}}
+    change = json.loads(json.dumps(monitor.state_diff(old, new)))
+    assert change["patch"]["ids"] == {"set": {"x": [1, 5], "z": [6, 6]}, "del": ["y"]}
+    data = copy.deepcopy(old)
+    monitor.apply_change(data, change)
+    del data["gone"]  # поля стану не зникають — state_diff їх не видаляє
+    assert data == new
+
+
+def test_no_change_no_line(state_files):
+    state = monitor.load_state()
+    monitor.save_state(state)
+    monitor.save_state(state)
+    assert not os.path.exists(monitor.STATE_JOURNAL)
+
+
+def test_journal_replay(state_files):
+    state = monitor.load_state()
+    monitor.save_state(state)                      # перший запис — знімок
+    state["eliky_ids"]["0123456789abcdef"] = [1, 2]
+    state["unci_update_date"] = "12.03.2026"
+    monitor.save_state(state)                      # далі — рядок журналу
+    state["eliky_ids"]["fedcba9876543210"] = [3, 4]
+    monitor.save_state(state)
+    assert len(journal_lines(monitor.STATE_JOURNAL)) == 2
+    loaded = monitor.load_state()
+    assert loaded["eliky_ids"] == state["eliky_ids"]
+    assert loaded["unci_update_date"] == "12.03.2026"
+
+
+def test_stale_generation_skipped(state_files):
+    state = monitor.load_state()
+    monitor.save_state(state)
+    with open(monitor.STATE_JOURNAL, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"set": {"unci_update_date": "old"}, "g": "stale"}) + "\n")
+    assert monitor.load_state()["unci_update_date"] == ""
+
+
+def test_torn_line_recovers_incremental_writes(state_files):
+    state = monitor.load_state()
+    monitor.save_state(state)
+    state["unci_update_date"] = "01.01.2026"
+    monitor.save_state(state)
+    with open(monitor.STATE_JOURNAL, "a", encoding="utf-8") as f:
+        f.write('{"set": {"unci_update_date": "02.0')     # job зупинили посеред рядка
+    state = monitor.load_state()
+    assert state["unci_update_date"] == "01.01.2026"
+    monitor.save_state(state)                          # після обірваного рядка — знімок
+    # Журнал лишається (порожнім) — інакше кеш GitHub Actions відновив би старий
+    assert os.path.exists(monitor.STATE_JOURNAL)
+    assert journal_lines(monitor.STATE_JOURNAL) == []
+    for day in range(2, 5):                            # і наступні запуски знову пишуть рядками
+        state = monitor.load_state()
+        state["unci_update_date"] = f"0{day}.01.2026"
+        monitor.save_state(state)
+    assert len(journal_lines(monitor.STATE_JOURNAL)) == 3
+    assert monitor.load_state()["unci_update_date"] == "04.01.2026"
+
+
+def test_compaction(state_files, monkeypatch):
+    monkeypatch.setattr(monitor, "STATE_COMPACT_EVERY", 3)
+    state = monitor.load_state()
+    for i in range(5):
+        state["unci_week_number"] = i + 1
+        monitor.save_state(state)
+    # знімок, 3 рядки, знімок, 0 рядків
+    assert journal_lines(monitor.STATE_JOURNAL) == []
+    assert monitor.load_state()["unci_week_number"] == 5
+
+
+def test_snapshot_keeps_file_mode(state_files):
+    state = monitor.load_state()
+    monitor.save_state(state)
+    os.chmod(monitor.STATE_FILE, 0o644)
+    monitor.write_snapshot(state)
+    assert os.stat(monitor.STATE_FILE).st_mode & 0o777 == 0o644
+
+
+def test_packed_seen_roundtrip(state_files, monkeypatch):
+    monkeypatch.setattr(monitor, "SEEN_FORMAT", "packed")
+    state = monitor.load_state()
+    state["eliky_ids"] = {f"{i:016x}": [i, i + 1] for i in range(0, 5000, 7)}
+    monitor.save_state(state)
+    with open(monitor.STATE_FILE, encoding="utf-8") as f:
+        assert json.load(f)["eliky_ids"]["format"] == "packed"
+    assert monitor.load_state()["eliky_ids"] == state["eliky_ids"]